@@ -8,22 +8,27 @@ from PyQt5.QtCore import QObject, pyqtSignal
 from PyQt5.QtWidgets import QMessageBox, QMenu, QMenuBar
 
 import gwid.logs
+from app.loader import image_cache
 from app.menu import GMenuBar
 from store.obj import Resource
 from store.store import Store
-from core import services
+from core import services, watcher
 from core.configuration import GatorConf, PathFinder
 from core.navigator import Universe
 
 LOG = logging.getLogger(__name__)
 
+SCAN_PROGRESS_INTERVAL = 1000
+
 
 class Ctrl(QObject):
 
     sgn_main_window_closing = pyqtSignal()
     sgn_switch_configuration = pyqtSignal()
     sgn_switch_universe = pyqtSignal()
+    sgn_universe_changed = pyqtSignal()
     sgn_resource_changed = pyqtSignal(Resource)
+    sgn_watch_events = pyqtSignal(list)
 
     def __init__(self, gator_config: GatorConf):
         QObject.__init__(self)
@@ -35,11 +40,15 @@ class Ctrl(QObject):
         LOG.info("Configuration: %s" % self.configuration_file)
         LOG.info("Gator Home   : %s" % self.gator_home)
 
-        self.universe = Universe(self.config.universe_list())
+        self.universe = self.create_universe()
         LOG.info(self.universe.to_string())
+        self.watcher = None
+        self.sgn_watch_events.connect(self.on_watch_events)
+        self.start_watcher()
         db_home = os.path.join(self.gator_home, "db")
         self.store = Store(db_home)
         LOG.info("Gator store  : %s" % self.store.store_home)
+        self.image_cache = image_cache()
 
         self.last_viewer = None
         self.is_closing = False
@@ -104,6 +113,7 @@ class Ctrl(QObject):
         return self.__menu_bar.menu_close_viewer
 
     def close(self):
+        self.stop_watcher()
         self.store.close()
         if not self.is_closing:
             self.is_closing = True
@@ -136,11 +146,47 @@ class Ctrl(QObject):
         LOG.info("Gator store            : %s" % self.store.store_home)
         self.switch_universe()
 
+    def create_universe(self) -> Universe:
+        return Universe(self.config.universe_list(), workers=self.config.scan_workers(),
+                        progress=Ctrl.__scan_progress, index_file=os.path.join(self.gator_home, "universe.idx"))
+
     def switch_universe(self):
-        self.universe = Universe(self.config.universe_list())
+        self.stop_watcher()
+        self.universe = self.create_universe()
         LOG.info(self.universe.to_string())
+        self.image_cache.clear()
+        self.start_watcher()
         self.sgn_switch_universe.emit()
 
+    def start_watcher(self):
+        if self.config.watch_universe() and self.universe.paths_count() > 0:
+            self.watcher = watcher.create_watcher(self.universe.path_list(), self.sgn_watch_events.emit,
+                                                  accept=Universe.is_image, known=self.universe.filenames(),
+                                                  polling=self.config.watch_polling(),
+                                                  interval=self.config.watch_interval())
+            self.watcher.start()
+
+    def stop_watcher(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def on_watch_events(self, events: list):
+        if self.watcher is None:
+            return
+        if (watcher.RESCAN, None) in events:
+            LOG.info("Universe watcher lost events, rescanning")
+            self.switch_universe()
+        elif self.universe.apply(events):
+            LOG.info("Universe changed: %s" % self.universe.to_string())
+            self.sgn_universe_changed.emit()
+
+    @staticmethod
+    def __scan_progress(folders, files):
+        if folders % SCAN_PROGRESS_INTERVAL == 0:
+            LOG.info("Scanning universe: %s folders, %s files" % (services.Format.decimal(folders),
+                                                                  services.Format.decimal(files)))
+
     def set_last_viewer(self, viewer):
         self.last_viewer = viewer
 
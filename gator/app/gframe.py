@@ -32,6 +32,7 @@ class GFrame(QFrame):
         self.ctrl = QApplication.instance().ctrl
         self.ctrl.sgn_switch_configuration.connect(self.on_sgn_switch_configuration)
         self.ctrl.sgn_switch_universe.connect(self.on_sgn_switch_universe)
+        self.ctrl.sgn_universe_changed.connect(self.on_sgn_universe_changed)
         self.ctrl.sgn_main_window_closing.connect(self.on_main_window_closing)
 
         self.path_finder = self.ctrl.path_finder  # type: PathFinder
@@ -139,6 +140,13 @@ class GFrame(QFrame):
     def on_sgn_switch_universe(self):
         LOG.debug("sgn_switch_universe received")
         self.universe = self.ctrl.universe  # type: Universe
+        if self.next_navigator is not None:
+            self.next_navigator.release()
+            self.next_navigator = None
+        self.lbl_universe.setText(self.universe.to_string())
+        self.btn_viewer.setEnabled(self.universe.filename_count() > 0)
+
+    def on_sgn_universe_changed(self):
         self.lbl_universe.setText(self.universe.to_string())
         self.btn_viewer.setEnabled(self.universe.filename_count() > 0)
 
@@ -171,7 +179,7 @@ class GFrame(QFrame):
         LOG.debug("Get open filename from %s" % common_prefix)
         filename = QFileDialog.getOpenFileName(self, "Open File", common_prefix, filter=Universe.filter_list())
         if filename[0] != "":
-            if filename[0] in self.universe.filename_list():
+            if self.universe.contains(filename[0]):
                 Viewer(self, Navigator(self.ctrl.store, self.universe, filename[0]))
             else:
                 self.ctrl.info("%s not in this universe" % filename[0])
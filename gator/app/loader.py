@@ -0,0 +1,224 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Decoding images on worker threads.
+
+An :class:`ImageLoader` reads and decodes images into a :class:`QImage` on a :class:`QThreadPool`, scales them
+to the requested size on the same worker and delivers the result on the thread of the loader. A new request
+makes all earlier requests of the same loader stale: requests that did not start yet are skipped, images that
+are still decoding are not delivered.
+
+Images that are requested at a size smaller than their original size are decoded at reduced resolution, which
+for JPEG images is done while decoding; the original size is kept in the text of the image.
+
+Loaders can share an image cache. Images that are likely to be requested next can be decoded ahead into the
+cache with :meth:`ImageLoader.prefetch`.
+"""
+import logging
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QSize, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+
+from core.services import LruCache
+from store.obj import Resource
+
+LOG = logging.getLogger(__name__)
+
+#: Number of worker threads per loader.
+LOADER_THREADS = 2
+#: Bytes of decoded images kept in an image cache.
+IMAGE_CACHE_BYTES = 256 * 1024 * 1024
+#: Thread pool priority of images requested with load.
+LOAD_PRIORITY = 1
+#: Thread pool priority of images requested with prefetch.
+PREFETCH_PRIORITY = 0
+#: Key of the original size in the text of decoded images.
+ORIGINAL_SIZE_KEY = "gator.original_size"
+
+
+def decode_image(filename: str, size: QSize=None) -> QImage:
+    """
+    Read and decode the given image file, scaled to fit the given size. Images larger than the given size are
+    decoded at reduced resolution if the image format supports it.
+
+    :param str filename: the image file
+    :param QSize size: the size to fit the image in, keeping its aspect ratio; `None` for the original size
+    :return: the image, a null image if the file could not be read
+    """
+    reader = QImageReader(filename)
+    original = reader.size()
+    if size is not None and size.isValid() and original.isValid():
+        fit = original.scaled(size, Qt.KeepAspectRatio)
+        if fit.width() < original.width():
+            reader.setScaledSize(fit)
+    image = reader.read()
+    if image.isNull():
+        return image
+    if not original.isValid():
+        original = image.size()
+    if size is not None and size.isValid():
+        fit = image.size().scaled(size, Qt.KeepAspectRatio)
+        if fit != image.size():
+            image = image.scaled(fit, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    image.setText(ORIGINAL_SIZE_KEY, "%d,%d" % (original.width(), original.height()))
+    return image
+
+
+def original_size(image: QImage) -> QSize:
+    """
+    The size of the image file the given image was decoded from.
+
+    :param QImage image: an image decoded with :func:`decode_image`
+    :return: the original size, the size of the image if not known
+    """
+    text = image.text(ORIGINAL_SIZE_KEY)
+    if not text:
+        return image.size()
+    width, height = text.split(",")
+    return QSize(int(width), int(height))
+
+
+def image_key(filename: str, size: QSize=None) -> tuple:
+    if size is None or not size.isValid():
+        return filename, -1, -1
+    return filename, size.width(), size.height()
+
+
+def image_cache(max_size: int=IMAGE_CACHE_BYTES) -> LruCache:
+    """
+    Create a cache for decoded images, bounded by the number of bytes of the images.
+
+    :param int max_size: maximum number of bytes
+    :return: an empty cache
+    """
+    return LruCache(max_size, sizeof=lambda image: image.sizeInBytes())
+
+
+class _DecodeTask(QRunnable):
+
+    def __init__(self, loader: 'ImageLoader', generation: int, key: tuple, size: QSize):
+        QRunnable.__init__(self)
+        self.__loader = loader
+        self.__generation = generation
+        self.__key = key
+        self.__size = size
+
+    def run(self):
+        if not self.__loader.is_wanted(self.__generation, self.__key):
+            self.__loader.sgn_decoded.emit(self.__key, None)
+            return
+        self.__loader.sgn_decoded.emit(self.__key, decode_image(self.__key[0], self.__size))
+
+
+class ImageLoader(QObject):
+    """
+    Loads images for a viewer. Only the image of the latest request is delivered with :attr:`sgn_image_loaded`.
+    """
+
+    sgn_image_loaded = pyqtSignal(Resource, QImage)
+    # emitted on worker threads with the decoded image or None if skipped, delivered on the thread of the loader
+    sgn_decoded = pyqtSignal(object, object)
+
+    def __init__(self, parent: QObject=None, cache: LruCache=None, threads: int=LOADER_THREADS):
+        """
+        Initialize an :class:`ImageLoader`.
+
+        :param QObject parent: the parent of this loader
+        :param LruCache cache: optional image cache, may be shared with other loaders
+        :param int threads: number of worker threads
+        """
+        QObject.__init__(self, parent)
+        self.__cache = cache
+        self.__pool = QThreadPool(self)
+        self.__pool.setMaxThreadCount(threads)
+        self.__lock = threading.Lock()
+        self.__generation = 0
+        self.__request = None
+        self.__pending = set()
+        self.sgn_decoded.connect(self.__on_decoded, Qt.QueuedConnection)
+
+    def load(self, resource: Resource, size: QSize=None):
+        """
+        Load the image of the given resource, cancelling earlier requests. A cached image is delivered right away.
+
+        :param Resource resource: the resource to load
+        :param QSize size: the size to fit the image in; `None` for the original size
+        """
+        key = image_key(resource.filename(), size)
+        generation = self.cancel()
+        image = None if self.__cache is None else self.__cache.get(key)
+        if image is not None:
+            self.sgn_image_loaded.emit(resource, image)
+            return
+        with self.__lock:
+            self.__request = (resource, key, size)
+        if key not in self.__pending:
+            # else it is decoding on behalf of an earlier request or prefetch and delivered when done
+            self.__start(generation, key, size, LOAD_PRIORITY)
+
+    def prefetch(self, filenames: list, size: QSize=None):
+        """
+        Decode the given images into the cache, after the image requested with :meth:`load`. Prefetches that did
+        not start yet are skipped on the next request.
+
+        :param list filenames: the images to decode, most wanted first
+        :param QSize size: the size to fit the images in; `None` for the original size
+        """
+        if self.__cache is None:
+            return
+        generation = self.generation()
+        for filename in filenames:
+            key = image_key(filename, size)
+            if key not in self.__cache and key not in self.__pending:
+                self.__start(generation, key, size, PREFETCH_PRIORITY)
+
+    def __start(self, generation: int, key: tuple, size: QSize, priority: int):
+        self.__pending.add(key)
+        self.__pool.start(_DecodeTask(self, generation, key, size), priority)
+
+    def cancel(self) -> int:
+        """
+        Make all requests so far stale.
+
+        :return: the new generation of requests
+        """
+        with self.__lock:
+            self.__generation += 1
+            self.__request = None
+            return self.__generation
+
+    def generation(self) -> int:
+        with self.__lock:
+            return self.__generation
+
+    def is_wanted(self, generation: int, key: tuple) -> bool:
+        with self.__lock:
+            return generation == self.__generation or (self.__request is not None and self.__request[1] == key)
+
+    def close(self):
+        """
+        Cancel all requests and wait for running decodes to finish.
+        """
+        self.cancel()
+        self.__pool.clear()
+        self.__pool.waitForDone()
+
+    def __on_decoded(self, key: tuple, image: QImage or None):
+        self.__pending.discard(key)
+        if image is None:
+            with self.__lock:
+                request = self.__request
+            if request is not None and request[1] == key:
+                # skipped as stale before it was requested again
+                self.__start(self.generation(), key, request[2], LOAD_PRIORITY)
+            return
+        if self.__cache is not None and not image.isNull():
+            self.__cache.put(key, image)
+        with self.__lock:
+            request = self.__request
+            if request is None or request[1] != key:
+                LOG.debug("Not delivering image %s" % key[0])
+                return
+            self.__request = None
+        self.sgn_image_loaded.emit(request[0], image)
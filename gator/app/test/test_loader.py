@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QSize, QTimer, Qt
+from PyQt5.QtGui import QImage, QColor
+
+from app import loader
+from app.loader import ImageLoader, image_cache, original_size
+from store.obj import Resource
+
+
+class TestImageLoader(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filenames = []
+        for name in ["a.jpg", "b.jpg"]:
+            filename = os.path.join(self.tmp.name, name)
+            image = QImage(600, 400, QImage.Format_RGB32)
+            image.fill(QColor("red"))
+            image.save(filename, "JPG")
+            self.filenames.append(filename)
+        self.loaded = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def wait_loaded(self, image_loader: ImageLoader, timeout=5000):
+        loop = QEventLoop()
+        image_loader.sgn_image_loaded.connect(loop.quit)
+        QTimer.singleShot(timeout, loop.quit)
+        loop.exec_()
+
+    def test_decode_reduced(self):
+        image = loader.decode_image(self.filenames[0], QSize(60, 60))
+        self.assertEqual(QSize(60, 40), image.size())
+        self.assertEqual(QSize(600, 400), original_size(image))
+
+    def test_load_after_stale_prefetch(self):
+        release = threading.Event()
+        skipped = threading.Event()
+        decode = loader.decode_image
+
+        def blocking_decode(filename, size=None):
+            if filename == self.filenames[0]:
+                release.wait(5)
+            return decode(filename, size)
+
+        def on_decoded(key, image):
+            if key[0] == self.filenames[1] and image is None:
+                skipped.set()
+
+        with mock.patch.object(loader, "decode_image", blocking_decode):
+            image_loader = ImageLoader(cache=image_cache(), threads=1)
+            image_loader.sgn_image_loaded.connect(lambda resource, image: self.loaded.append(resource.filename()))
+            image_loader.sgn_decoded.connect(on_decoded, Qt.DirectConnection)
+            image_loader.load(Resource(self.filenames[0]))
+            image_loader.prefetch([self.filenames[1]])
+            image_loader.cancel()
+            release.set()
+            self.assertTrue(skipped.wait(5))
+
+            # requested again before the skip reached the loader
+            image_loader.load(Resource(self.filenames[1]))
+            self.wait_loaded(image_loader)
+            image_loader.close()
+        self.assertEqual([self.filenames[1]], self.loaded)
+
+    def test_refresh_during_load(self):
+        # a viewer refreshes the current image on resize with a second loader on the same cache
+        release = threading.Event()
+        decode = loader.decode_image
+
+        def blocking_decode(filename, size=None):
+            if filename == self.filenames[1]:
+                release.wait(5)
+            return decode(filename, size)
+
+        with mock.patch.object(loader, "decode_image", blocking_decode):
+            cache = image_cache()
+            image_loader = ImageLoader(cache=cache)
+            refresh_loader = ImageLoader(cache=cache, threads=1)
+            image_loader.sgn_image_loaded.connect(lambda resource, image: self.loaded.append(resource.filename()))
+            refreshed = []
+            refresh_loader.sgn_image_loaded.connect(lambda resource, image: refreshed.append(image.size()))
+
+            image_loader.load(Resource(self.filenames[1]), QSize(60, 60))
+            refresh_loader.load(Resource(self.filenames[0]), QSize(300, 300))
+            self.wait_loaded(refresh_loader)
+            release.set()
+            self.wait_loaded(image_loader)
+            image_loader.close()
+            refresh_loader.close()
+        self.assertEqual([QSize(300, 200)], refreshed)
+        self.assertEqual([self.filenames[1]], self.loaded)
@@ -4,11 +4,12 @@ import logging
 import subprocess
 
 import exifread
-from PyQt5.QtCore import Qt, pyqtSignal, QEvent
-from PyQt5.QtGui import QPixmap, QKeyEvent, QCloseEvent, QMouseEvent, QFont
+from PyQt5.QtCore import Qt, pyqtSignal, QEvent, QSize
+from PyQt5.QtGui import QPixmap, QKeyEvent, QCloseEvent, QMouseEvent, QFont, QImage
 from PyQt5.QtWidgets import QLabel, QApplication, QWidget, QVBoxLayout, QCheckBox, QGridLayout, QPushButton, \
     QHBoxLayout, QLayout, QMenu, QAction, QFrame, QMessageBox, QComboBox
 
+from app.loader import ImageLoader, decode_image, original_size
 from app.style import Style
 from app.widgets import BrowserWindow
 from store.obj import Resource
@@ -19,6 +20,8 @@ from gwid.util import GIcon, GHotKey
 
 MAX_SIZE = 16777215
 MIN_SIZE = 0
+#: Number of images decoded ahead of navigation.
+PREFETCH_COUNT = 4
 
 LOG = logging.getLogger(__name__)
 
@@ -45,6 +48,16 @@ class Viewer(QLabel):
 
         self.move(self.ctrl.config.viewer_window_x(), self.ctrl.config.viewer_window_y())
         self.pixmap = None
+        self.original_size = QSize()
+        self.loader = ImageLoader(self, self.ctrl.image_cache)
+        self.loader.sgn_image_loaded.connect(self.on_image_loaded)
+        # refreshes at a larger size have their own loader, so they do not cancel navigation
+        self.refresh_loader = ImageLoader(self, self.ctrl.image_cache, threads=1)
+        self.refresh_loader.sgn_image_loaded.connect(self.on_image_refreshed)
+        # copies are decoded at original size, not through the image cache
+        self.copy_loader = ImageLoader(self, threads=1)
+        self.copy_loader.sgn_image_loaded.connect(self.on_copy_loaded)
+        self.refresh_resource = None
         self.menu_actions_set = False
 
         # actions
@@ -114,36 +127,68 @@ class Viewer(QLabel):
     def connect_signals(self):
         self.ctrl.sgn_main_window_closing.connect(self.on_main_window_closing)
         self.ctrl.sgn_switch_universe.connect(self.on_sgn_switch_universe)
+        self.ctrl.sgn_universe_changed.connect(self.on_sgn_universe_changed)
 
     def on_sgn_switch_universe(self):
         LOG.debug("sgn_switch_universe received")
+        self.navigator.release()
         self.navigator = Navigator(self.ctrl.store, self.ctrl.universe)
 
+    def on_sgn_universe_changed(self):
+        self.view_control.on_universe_changed()
+
     def resizeEvent(self, event):
+        if self.pixmap is None:
+            return
         pixmap = self.pixmap.scaled(event.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
         self.setPixmap(pixmap)
         self.resize(pixmap.size())
+        # the image was decoded at reduced resolution and the window outgrew it
+        if pixmap.width() > self.pixmap.width() and self.original_size.width() > self.pixmap.width():
+            self.refresh_resource = self.current_resource
+            self.refresh_loader.load(self.current_resource, event.size())
         self.view_control.on_viewer_resize_event()
 
+    def target_size(self) -> QSize or None:
+        if self.scale_screen_size:
+            rect = QApplication.desktop().screenGeometry()
+            max_height = rect.height() - self.pos().y() - 50
+            max_width = rect.width() - self.pos().x() - 5
+            return QSize(max_width, max_height)
+        return None
+
     def set_resource(self, resource: Resource):
-        pixmap = QPixmap(resource.filename())
-        if pixmap.isNull():
+        self.refresh_resource = None
+        self.refresh_loader.cancel()
+        size = self.target_size()
+        # the first image is decoded right away, to size the window and the view control on
+        if self.pixmap is None:
+            self.on_image_loaded(resource, decode_image(resource.filename(), size))
+        else:
+            self.loader.load(resource, size)
+        self.loader.prefetch(self.navigator.peek(PREFETCH_COUNT), size)
+
+    def on_image_refreshed(self, resource: Resource, image: QImage):
+        # set_resource drops the refresh of an image that is navigated away from
+        if resource is not self.refresh_resource or resource is not self.current_resource:
+            return
+        self.refresh_resource = None
+        if not image.isNull():
+            self.original_size = original_size(image)
+            self.pixmap = QPixmap.fromImage(image)
+            self.setPixmap(self.pixmap.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+    def on_image_loaded(self, resource: Resource, image: QImage):
+        if image.isNull():
             self.ctrl.warn("Unable to load %s" % resource.filename())
             if self.pixmap is None:
                 self.pixmap = QPixmap(150, 300)
         else:
             self.current_resource = resource
-            self.pixmap = pixmap
-            if self.scale_screen_size:
-                rect = QApplication.desktop().screenGeometry()
-                max_height = rect.height() - self.pos().y() - 50
-                max_width = rect.width() - self.pos().x() - 5
-                pixmap_scaled = self.pixmap.scaled(max_width, max_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.setPixmap(pixmap_scaled)
-                self.resize(pixmap_scaled.size())
-            else:
-                self.setPixmap(self.pixmap)
-                self.resize(self.pixmap.size())
+            self.original_size = original_size(image)
+            self.pixmap = QPixmap.fromImage(image)
+            self.setPixmap(self.pixmap)
+            self.resize(self.pixmap.size())
 
             self.setWindowTitle(self.current_resource.long_name())
             self.action_close_me.setText(self.current_resource.long_name())
@@ -292,7 +337,13 @@ class Viewer(QLabel):
         QApplication.clipboard().setText(self.current_resource.filename())
 
     def copy_pixmap(self):
-        QApplication.clipboard().setPixmap(self.pixmap)
+        self.copy_loader.load(self.current_resource)
+
+    def on_copy_loaded(self, resource: Resource, image: QImage):
+        if image.isNull():
+            self.ctrl.warn("Unable to copy %s" % resource.filename())
+        else:
+            QApplication.clipboard().setImage(image)
 
     def show_exif_data(self):
         if self.current_resource.has_file():
@@ -320,6 +371,10 @@ class Viewer(QLabel):
         self.persist()
         if self.view_control is not None:
             self.view_control.close()
+        self.loader.close()
+        self.refresh_loader.close()
+        self.copy_loader.close()
+        self.navigator.release()
         event.accept()
 
     def persist(self):
@@ -494,6 +549,9 @@ class ViewControl(QWidget):
         self.toggle_max_height.setChecked(self.viewer.maximumHeight() != MAX_SIZE)
         self.toggle_max_width.setChecked(self.viewer.maximumWidth() != MAX_SIZE)
 
+    def on_universe_changed(self):
+        self.nav_title.setText("Navigate %d x %d" % self.viewer.navigator.space()[0:2])
+
     def on_toggle_max_width(self, checked):
         self.viewer.toggle_max_width(checked)
         text = ("fixed max width %s" % str(self.viewer.width()) if checked else "fix max width")
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 import logging
 import os
+import struct
+from datetime import datetime, timedelta
 
 from bsddb3 import db
 from bsddb3.dbobj import DB, DBEnv
@@ -10,11 +12,145 @@ LOG = logging.getLogger(__name__)
 
 LIST_SEP = "|"
 
+TEXT_DATE_FORMAT = "%Y%m%d%H%M%S"
+
+#: Header of a packed date list: the number of dates, little-endian uint32.
+DATES_HEADER = struct.Struct("<I")
+#: A packed date: seconds since the epoch of a naive datetime, little-endian int64.
+DATE_ITEM = struct.Struct("<q")
+
+EPOCH = datetime(1970, 1, 1)
+
+#: Number of times a transaction is retried after a deadlock.
+DEADLOCK_RETRIES = 3
+#: A checkpoint is taken if this many kilobytes of log were written since the last checkpoint.
+CHECKPOINT_KBYTES = 1024
+#: A checkpoint is taken if this many minutes passed since the last checkpoint.
+CHECKPOINT_MINUTES = 5
+#: Number of records visited per transaction when migrating date lists.
+MIGRATE_BATCH_SIZE = 1000
+
+GIGABYTE = 1024 ** 3
+MEGABYTE = 1024 ** 2
+
+#: Bounds of the memory pool size that is derived from the size of the databases.
+MIN_CACHE_SIZE = 16 * MEGABYTE
+MAX_CACHE_SIZE = 512 * MEGABYTE
+
+
+def is_packed(value: bytes) -> bool:
+    """
+    Is the given value a packed date list. Values in the old text format consist of digits and LIST_SEP;
+    their first four bytes never give the count that matches the length of the value.
+    """
+    if len(value) < DATES_HEADER.size or (len(value) - DATES_HEADER.size) % DATE_ITEM.size != 0:
+        return False
+    return DATES_HEADER.unpack_from(value)[0] == (len(value) - DATES_HEADER.size) // DATE_ITEM.size
+
+
+def pack_dates(dates: list) -> bytes:
+    """
+    Pack the given dates: a count header followed by the seconds since the epoch of each date.
+    :param dates: list of naive datetime
+    :return: packed dates
+    """
+    seconds = [(date - EPOCH) // timedelta(seconds=1) for date in dates]
+    return struct.pack("<I%dq" % len(seconds), len(seconds), *seconds)
+
+
+def unpack_dates(value: bytes) -> list:
+    """
+    Unpack dates packed by pack_dates, or parse dates in the old text format.
+    :param value: packed dates or text
+    :return: list of datetime, empty if value is None
+    """
+    if not value:
+        return []
+    if not is_packed(value):
+        return [datetime.strptime(string, TEXT_DATE_FORMAT) for string in value.decode("utf-8").split(LIST_SEP)]
+    count = DATES_HEADER.unpack_from(value)[0]
+    seconds = struct.unpack_from("<%dq" % count, value, DATES_HEADER.size)
+    return [EPOCH + timedelta(seconds=second) for second in seconds]
+
+
+def unpack_count(value: bytes) -> int:
+    """
+    The number of dates in packed dates or in text. For packed dates only the header is read.
+    :param value: packed dates, text or the header of packed dates
+    :return: number of dates, 0 if value is None
+    """
+    if not value:
+        return 0
+    if len(value) == DATES_HEADER.size or is_packed(value):
+        return DATES_HEADER.unpack_from(value)[0]
+    return len(value.split(LIST_SEP.encode("utf-8")))
+
+
+def unpack_latest(value: bytes) -> datetime or None:
+    """
+    The last date in packed dates or in text. For packed dates only the last item is read.
+    :param value: packed dates or text
+    :return: datetime, None if value is None
+    """
+    if not value or len(value) == DATES_HEADER.size:
+        return None
+    if not is_packed(value):
+        return datetime.strptime(value.decode("utf-8").rsplit(LIST_SEP, 1)[-1], TEXT_DATE_FORMAT)
+    return EPOCH + timedelta(seconds=DATE_ITEM.unpack_from(value, len(value) - DATE_ITEM.size)[0])
+
+
+def latest_key(date: datetime, key: str) -> str:
+    """
+    The key of a record in a latest index: the date in text format, LIST_SEP and the key of the record in
+    the indexed database. Latest keys sort on date, then on key.
+    """
+    return "%s%s%s" % (date.strftime(TEXT_DATE_FORMAT), LIST_SEP, key)
+
+
+def split_latest_key(latest: str) -> (datetime, str):
+    date_str, key = latest.split(LIST_SEP, 1)
+    return datetime.strptime(date_str, TEXT_DATE_FORMAT), key
+
 
 class BDB(DB):
 
-    def __init__(self, db_env, flags=0):
+    def __init__(self, db_env, flags=0, transactional=False):
         DB.__init__(self, db_env, flags)
+        self.__db_env = db_env
+        self.__transactional = transactional
+
+    def is_transactional(self) -> bool:
+        return self.__transactional
+
+    def transact(self, function, retries=DEADLOCK_RETRIES):
+        """
+        Call function(txn) in a transaction, if this database is transactional; otherwise call function(None).
+        The transaction is committed if the function returns, aborted if it raises. A transaction that is
+        aborted because of a deadlock is retried.
+        :param function: callable that takes a transaction
+        :param retries: number of retries after a deadlock
+        :return: the result of the function
+        """
+        if not self.__transactional:
+            return function(None)
+        attempt = 0
+        while True:
+            txn = self.__db_env.txn_begin()
+            try:
+                result = function(txn)
+            except db.DBLockDeadlockError:
+                txn.abort()
+                attempt += 1
+                if attempt > retries:
+                    raise
+                LOG.debug("Deadlock, retrying transaction #%d" % attempt)
+                continue
+            except Exception:
+                txn.abort()
+                raise
+            txn.commit()
+            self.__db_env.txn_checkpoint(CHECKPOINT_KBYTES, CHECKPOINT_MINUTES)
+            return result
 
     @staticmethod
     def __encode(value):
@@ -51,14 +187,52 @@ class BDB(DB):
     def put(self, key, data, txn=None, flags=0, dlen=-1, doff=-1) -> int:
         return super().put(self.__encode(key), self.__encode(data), txn, flags, dlen, doff)
 
+    def get_bytes(self, key, default=None, txn=None, flags=0, dlen=-1, doff=-1) -> bytes:
+        """
+        Get the value of the given key as bytes.
+        """
+        return super().get(self.__encode(key), default, txn, flags, dlen, doff)
+
+    def put_bytes(self, key, data: bytes, txn=None, flags=0, dlen=-1, doff=-1) -> int:
+        return super().put(self.__encode(key), data, txn, flags, dlen, doff)
+
+    def iter_items(self, txn=None, dlen=-1, doff=-1, reverse=False):
+        """
+        Iterate over all items with a cursor, in key order or in reverse key order. Items are read one at a time.
+        With dlen and doff only the given part of each value is read.
+        :return: generator of (decoded key, value as bytes)
+        """
+        cursor = self.cursor(txn)
+        try:
+            record = cursor.last(dlen=dlen, doff=doff) if reverse else cursor.first(dlen=dlen, doff=doff)
+            while record is not None:
+                yield self.__decode(record[0]), record[1]
+                record = cursor.prev(dlen=dlen, doff=doff) if reverse else cursor.next(dlen=dlen, doff=doff)
+        finally:
+            cursor.close()
+
+    def iter_keys(self, txn=None):
+        return (key for key, value in self.iter_items(txn, dlen=0, doff=0))
+
+    def iter_values(self, txn=None, dlen=-1, doff=-1):
+        return (value for key, value in self.iter_items(txn, dlen, doff))
+
     def items_decoded(self, txn=None) -> [()]:
-        return [(self.__decode(tup[0]), self.__decode(tup[1])) for tup in super().items(txn)]
+        """
+        All items of a database of date lists, with their dates unpacked.
+        :return: list of (decoded key, list of datetime)
+        """
+        return [(key, unpack_dates(value)) for key, value in self.iter_items(txn)]
 
     def keys_decoded(self, txn=None) -> []:
-        return [self.__decode(key) for key in super().keys(txn)]
+        return list(self.iter_keys(txn))
 
     def values_decoded(self, txn=None) -> []:
-        return [self.__decode(value) for value in super().values(txn)]
+        """
+        All values of a database of date lists, unpacked.
+        :return: list of lists of datetime
+        """
+        return [unpack_dates(value) for value in self.iter_values(txn)]
 
     def get_list(self, key, default=None, txn=None, flags=0, dlen=-1, doff=-1):
         value = self.get(key, txn=txn, flags=flags, dlen=dlen, doff=doff)
@@ -71,24 +245,156 @@ class BDB(DB):
         value = LIST_SEP.join(data)
         self.put(key, value, txn, flags, dlen, doff)
 
+    def get_latest(self, key, txn=None) -> datetime or None:
+        """
+        Get the last of the packed dates of the given key. Only the header and the last date are read.
+        :return: datetime, None if the key has no dates
+        """
+        header = self.get_bytes(key, txn=txn, dlen=DATES_HEADER.size, doff=0)
+        if header is None:
+            return None
+        count = DATES_HEADER.unpack(header)[0]
+        size = self.get_size(key, txn)
+        if size != DATES_HEADER.size + count * DATE_ITEM.size:
+            return unpack_latest(self.get_bytes(key, txn=txn))
+        if count == 0:
+            return None
+        item = self.get_bytes(key, txn=txn, dlen=DATE_ITEM.size, doff=size - DATE_ITEM.size)
+        return EPOCH + timedelta(seconds=DATE_ITEM.unpack(item)[0])
+
+    def append_date(self, key, date: datetime, txn=None) -> int:
+        """
+        Append a date to the packed dates of the given key. Only the header and the new date are written,
+        with partial puts; the existing dates are not read. Use a transaction to make the two writes atomic.
+        :param key: the key
+        :param date: naive datetime to append
+        :param txn: optional transaction
+        :return: the number of dates of the key after appending
+        """
+        header = self.get_bytes(key, txn=txn, dlen=DATES_HEADER.size, doff=0)
+        if header is None:
+            self.put_bytes(key, pack_dates([date]), txn)
+            return 1
+        count = DATES_HEADER.unpack(header)[0]
+        size = self.get_size(key, txn)
+        if size != DATES_HEADER.size + count * DATE_ITEM.size:
+            # not packed yet
+            dates = unpack_dates(self.get_bytes(key, txn=txn))
+            dates.append(date)
+            self.put_bytes(key, pack_dates(dates), txn)
+            return len(dates)
+        self.put_bytes(key, DATE_ITEM.pack((date - EPOCH) // timedelta(seconds=1)), txn, dlen=0, doff=size)
+        self.put_bytes(key, DATES_HEADER.pack(count + 1), txn, dlen=DATES_HEADER.size, doff=0)
+        return count + 1
+
     def get_keys_with_latest_values(self, threshold=0, txn=None) -> dict:
+        """
+        Get the latest date of keys with more than threshold dates, for values that are date lists.
+        :return: dict of key to datetime
+        """
         latest = dict()
-        for item in self.items_decoded(txn):
-            items = item[1].split(LIST_SEP)
-            if len(items) > threshold:
-                latest[item[0]] = items[-1]
+        for key, value in self.iter_items(txn):
+            if unpack_count(value) > threshold:
+                latest[key] = unpack_latest(value)
         return latest
 
+    def migrate_dates(self, txn=None, before: bytes=None, batch_size=MIGRATE_BATCH_SIZE) -> (int, bytes or None):
+        """
+        Convert date lists in the old text format to packed dates, visiting at most batch_size records. Values
+        are converted from the last key to the first; so if the first value is packed, all values are packed
+        and nothing needs to be done.
+        :param txn: optional transaction
+        :param before: continue with the records before this key, as returned by the previous batch
+        :param batch_size: maximum number of records to visit
+        :return: (number of converted values, key to continue before or None if done)
+        """
+        cursor = self.cursor(txn)
+        try:
+            if before is None:
+                record = cursor.first()
+                if record is None or is_packed(record[1]):
+                    return 0, None
+                record = cursor.last()
+            else:
+                record = cursor.set_range(before)
+                record = cursor.last() if record is None else cursor.prev()
+            converted = 0
+            visited = 0
+            while record is not None:
+                if not is_packed(record[1]):
+                    cursor.put(record[0], pack_dates(unpack_dates(record[1])), db.DB_CURRENT)
+                    converted += 1
+                visited += 1
+                if visited >= batch_size:
+                    return converted, record[0]
+                record = cursor.prev()
+            return converted, None
+        finally:
+            cursor.close()
+
+    def migrate_all_dates(self, batch_size=MIGRATE_BATCH_SIZE) -> int:
+        """
+        Convert all date lists in the old text format to packed dates, in a transaction per batch of records.
+        An interrupted migration continues where it stopped the next time, because the first record is
+        converted last.
+        :param batch_size: number of records visited per transaction
+        :return: number of converted values
+        """
+        converted, before = self.transact(lambda txn: self.migrate_dates(txn, None, batch_size))
+        while before is not None:
+            count, before = self.transact(lambda txn: self.migrate_dates(txn, before, batch_size))
+            converted += count
+        return converted
 
-class Repository(object):
 
-    def __init__(self, db_home):
+class Repository(object):
+    """
+    A Berkeley DB environment with its databases.
+
+    A repository uses locking, logging and transactions. Every process opens the environment with the same
+    flags, so the application and the admin scripts can read and write the databases at the same time, and
+    committed writes survive a crash of the application. Commits are written to the log but not flushed to
+    disk, so the last commits may be lost if the operating system crashes; log records are flushed in groups
+    and at checkpoints.
+    """
+
+    def __init__(self, db_home, cache_size=None):
+        """
+        Open the environment in the given directory.
+
+        :param str db_home: the directory of the environment
+        :param int cache_size: size of the memory pool in bytes; None to derive the size from the size of the
+            databases in db_home, 0 for the default size of Berkeley DB
+        """
         LOG.info("db full version: %s" % str(db.full_version()))
         self.__db_home = os.path.abspath(db_home)
         os.makedirs(self.__db_home, exist_ok=True)
         self.__db_env = DBEnv()
-        self.__db_env.open(self.__db_home, db.DB_INIT_MPOOL | db.DB_CREATE)
+        if cache_size is None:
+            cache_size = Repository.cache_size_for(self.__db_home)
+        if cache_size:
+            self.__db_env.set_cachesize(cache_size // GIGABYTE, cache_size % GIGABYTE, 1)
+        self.__db_env.set_lk_detect(db.DB_LOCK_DEFAULT)
+        self.__db_env.set_flags(db.DB_TXN_WRITE_NOSYNC, 1)
+        # DB_REGISTER makes DB_RECOVER only run recovery if a process that used the environment failed.
+        flags = (db.DB_INIT_MPOOL | db.DB_CREATE | db.DB_INIT_TXN | db.DB_INIT_LOCK | db.DB_INIT_LOG | db.DB_THREAD
+                 | db.DB_REGISTER | db.DB_RECOVER)
+        self.__db_env.open(self.__db_home, flags)
         self.__databases = dict()
+        LOG.info("Opened repository @ %s, cache size %s" % (self.__db_home, cache_size or "default"))
+
+    @staticmethod
+    def cache_size_for(db_home) -> int:
+        """
+        A memory pool size that holds the databases in the given directory, with room to grow, within
+        MIN_CACHE_SIZE and MAX_CACHE_SIZE.
+        :param db_home: the directory of the environment
+        :return: size in bytes
+        """
+        size = 0
+        for dir_path, dir_names, filenames in os.walk(db_home):
+            size += sum(os.path.getsize(os.path.join(dir_path, name)) for name in filenames if name.endswith(".bdb"))
+        return max(MIN_CACHE_SIZE, min(MAX_CACHE_SIZE, size + size // 4))
 
     def db_home(self) -> str:
         return self.__db_home
@@ -99,20 +405,42 @@ class Repository(object):
     def bdb(self, filename, cache=True) -> BDB:
         if filename not in self.__databases:
             os.makedirs(os.path.dirname(os.path.join(self.__db_home, filename)), exist_ok=True)
-            bdb = BDB(self.__db_env)
-            bdb.open(filename, None, db.DB_BTREE, db.DB_CREATE)
+            bdb = BDB(self.__db_env, transactional=True)
+            bdb.open(filename, None, db.DB_BTREE, db.DB_CREATE | db.DB_AUTO_COMMIT | db.DB_THREAD)
             if cache:
                 self.__databases[filename] = bdb
         else:
             bdb = self.__databases[filename]
         return bdb
 
+    def checkpoint(self):
+        """
+        Flush the memory pool and write a checkpoint to the log, then remove log files that are no longer
+        needed for recovery.
+        """
+        self.__db_env.txn_checkpoint(0, 0, db.DB_FORCE)
+        self.__db_env.log_archive(db.DB_ARCH_REMOVE)
+
+    def mpool_stats(self) -> dict:
+        """
+        Statistics of the memory pool: cache_hit and cache_miss are the number of pages found and not found
+        in the pool, hit_ratio their ratio, cache_size the size of the pool in bytes.
+        :return: dict of statistics
+        """
+        stats = self.__db_env.memp_stat()[0]
+        requests = stats["cache_hit"] + stats["cache_miss"]
+        return {"cache_hit": stats["cache_hit"],
+                "cache_miss": stats["cache_miss"],
+                "hit_ratio": stats["cache_hit"] / requests if requests else 1.0,
+                "cache_size": stats["gbytes"] * GIGABYTE + stats["bytes"]}
+
     def close(self):
+        try:
+            LOG.info("mpool stats: %s" % self.mpool_stats())
+        except Exception as err:
+            LOG.debug("No mpool stats: %s" % err)
         for bdb in self.__databases.values():
             bdb.close()
+        self.__databases.clear()
+        self.checkpoint()
         self.__db_env.close(db.DB_FORCESYNC)
-
-
-
-
-
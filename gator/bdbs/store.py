@@ -6,13 +6,15 @@ import operator
 import os
 import re
 import shutil
+import weakref
 from abc import abstractmethod
+from collections import OrderedDict
 from datetime import datetime
 
 from bdbs import env
 from bdbs.env import BDB, Repository
 from store.obj import Resource
-from core.services import NlDialect
+from core.services import CountStat, NlDialect, Stat
 
 LOG = logging.getLogger(__name__)
 
@@ -20,11 +22,26 @@ DATE_FORMAT = "%Y%m%d%H%M%S"
 
 
 class DateStore(object):
+    """
+    A Store for a string and a bunch of dates, backed by a Berkeley DB database. An optional second database,
+    the latest index, holds a record per string keyed on its latest date, so that the history can be walked in
+    order of latest date.
+    """
 
-    def __init__(self, bdb: BDB, add_once=True):
+    def __init__(self, bdb: BDB, add_once=True, latest: BDB=None):
         self.bdb = bdb
+        self.latest = latest
         self.__add_once = add_once
         self.__dated_set = set()
+        self.__listeners = list()
+        self.__count_stat = None
+        self.__history = dict()
+        converted = self.bdb.migrate_all_dates()
+        if converted > 0:
+            LOG.info("Converted %d date lists of %s to packed dates" % (converted, self.__class__.__name__))
+        if self.latest is not None and next(self.latest.iter_keys(), None) is None \
+                and next(self.bdb.iter_keys(), None) is not None:
+            self.rebuild_latest()
 
     @abstractmethod
     def get_dates(self, resource: Resource) -> list:
@@ -34,56 +51,128 @@ class DateStore(object):
     def set_dates(self, resource: Resource, date_list: list):
         raise NotImplementedError
 
+    @abstractmethod
+    def append_date(self, resource: Resource, date: datetime):
+        raise NotImplementedError
+
     def append_dated(self, dated: list):
         self.__dated_set.update(dated)
 
     def clear_dated(self):
         self.__dated_set.clear()
 
+    def add_listener(self, listener):
+        self.__listeners.append(weakref.WeakMethod(listener))
+
+    def _notify_listeners(self, filename, count):
+        for ref in list(self.__listeners):
+            listener = ref()
+            if listener is None:
+                self.__listeners.remove(ref)
+            else:
+                listener(filename, count)
+
     def add_date_on(self, resource: Resource):
         if not(resource.filename() in self.__dated_set and self.__add_once):
-            new_date_str = datetime.today().strftime(DATE_FORMAT)
-            date_str = self.bdb.get(resource.filename())
-            date_str = new_date_str if date_str is None else "%s%s%s" % (date_str, env.LIST_SEP, new_date_str)
-            self.bdb.put(resource.filename(), date_str)
-            date_list = [datetime.strptime(string, DATE_FORMAT) for string in date_str.split(env.LIST_SEP)]
-            self.set_dates(resource, date_list)
+            new_date = datetime.today().replace(microsecond=0)
+            count = self.bdb.transact(lambda txn: self.__append_date(resource.filename(), new_date, txn))
+            self.append_date(resource, new_date)
             self.__dated_set.add(resource.filename())
-            LOG.debug("Set %s #%d on %s" % (self.__class__.__name__[:-5], len(date_list), resource.filename()))
+            if self.__count_stat is not None:
+                self.__count_stat.increment(resource.filename())
+            for threshold, history in self.__history.items():
+                if count > threshold:
+                    history[resource.filename()] = new_date
+                    history.move_to_end(resource.filename())
+            LOG.debug("Set %s #%d on %s" % (self.__class__.__name__[:-5], count, resource.filename()))
+            self._notify_listeners(resource.filename(), count)
+
+    def __append_date(self, filename, new_date, txn) -> int:
+        previous = None if self.latest is None else self.bdb.get_latest(filename, txn)
+        count = self.bdb.append_date(filename, new_date, txn)
+        if self.latest is not None:
+            if previous is not None and self.latest.has_key(env.latest_key(previous, filename), txn):
+                self.latest.delete(env.latest_key(previous, filename), txn)
+            self.latest.put_bytes(env.latest_key(new_date, filename), env.DATES_HEADER.pack(count), txn)
+        return count
+
+    def rebuild_latest(self):
+        """
+        Rebuild the latest index from the dates in this store.
+        :return: None
+        """
+        def rebuild(txn):
+            self.latest.truncate(txn)
+            for key, value in self.bdb.iter_items(txn):
+                latest = env.unpack_latest(value)
+                if latest is not None:
+                    self.latest.put_bytes(env.latest_key(latest, key), env.DATES_HEADER.pack(env.unpack_count(value)),
+                                          txn)
+        self.bdb.transact(rebuild)
+        self.__history.clear()
+        LOG.info("Rebuilt latest index of %s" % self.__class__.__name__)
 
     def update(self, resource: Resource):
         self.set_dates(resource, self.get_dates_for(resource))
 
     def get_dates_for(self, resource: Resource) -> list:
-        date_str_list = self.bdb.get_list(resource.filename(), default=list())
-        return [datetime.strptime(string, DATE_FORMAT) for string in date_str_list]
+        return env.unpack_dates(self.bdb.get_bytes(resource.filename()))
 
     def resource_generator(self) -> iter:
         def generator() -> Resource:
-            for item in self.bdb.items_decoded():
-                resource = Resource(item[0])
-                date_list = [datetime.strptime(string, DATE_FORMAT) for string in item[1].split(env.LIST_SEP)]
-                self.set_dates(resource, date_list)
+            for key, value in self.bdb.iter_items():
+                resource = Resource(key)
+                self.set_dates(resource, env.unpack_dates(value))
                 yield resource
         return generator
 
     def sequence_count(self, total=0):
         sequence = []
-        for value in self.bdb.values_decoded():
-            date_count = len(value.split(env.LIST_SEP))
-            sequence.append(date_count)
+        for value in self.bdb.iter_values(dlen=env.DATES_HEADER.size, doff=0):
+            sequence.append(env.unpack_count(value))
         x = len(sequence)
         if total > x:
             sequence.extend([0] * (total - x))
         return sequence
 
+    def count_stat(self) -> CountStat:
+        if self.__count_stat is None:
+            self.__count_stat = CountStat(self.count_map())
+        return self.__count_stat
+
+    def stat(self, total=0) -> Stat:
+        return self.count_stat().stat(total)
+
     def count_dates(self, filename):
-        dates = self.bdb.get(filename)
-        return 0 if dates is None else len(dates.split(env.LIST_SEP))
+        return env.unpack_count(self.bdb.get_bytes(filename, dlen=env.DATES_HEADER.size, doff=0))
+
+    def count_map(self) -> dict:
+        return {key: env.unpack_count(value)
+                for key, value in self.bdb.iter_items(dlen=env.DATES_HEADER.size, doff=0)}
+
+    def iter_history(self, threshold=0, reverse=False):
+        """
+        Iterate over strings with more than threshold dates, in order of latest date. With a latest index
+        this is a cursor walk that can be stopped at any point.
+        :param threshold: threshold for the number of dates
+        :param reverse: start with the most recent date
+        :return: generator of (string, latest date)
+        """
+        if self.latest is None:
+            latest = self.bdb.get_keys_with_latest_values(threshold)
+            yield from sorted(latest.items(), key=operator.itemgetter(1), reverse=reverse)
+            return
+        for key, value in self.latest.iter_items(reverse=reverse):
+            if env.unpack_count(value) > threshold:
+                latest, filename = env.split_latest_key(key)
+                yield filename, latest
 
     def history_items(self, threshold=0) -> [()]:
-        latest = self.bdb.get_keys_with_latest_values(threshold)
-        return sorted(latest.items(), key=operator.itemgetter(1))
+        history = self.__history.get(threshold)
+        if history is None:
+            history = OrderedDict(self.iter_history(threshold))
+            self.__history[threshold] = history
+        return list(history.items())
 
     def history_keys(self, threshold=0) -> []:
         return [item[0] for item in self.history_items(threshold)]
@@ -97,6 +186,9 @@ class AcmeDateStore(DateStore):
     def set_dates(self, resource: Resource, date_list: list):
         resource.set_acme_dates(date_list)
 
+    def append_date(self, resource: Resource, date: datetime):
+        resource.add_acme_date(date)
+
 
 class ViewDateStore(DateStore):
 
@@ -106,14 +198,23 @@ class ViewDateStore(DateStore):
     def set_dates(self, resource: Resource, date_list: list):
         resource.set_view_dates(date_list)
 
+    def append_date(self, resource: Resource, date: datetime):
+        resource.add_view_date(date)
+
 
 class Store(object):
     """
     Store and factory for x_store objects. A store can replicate itself.
     """
 
-    def __init__(self, db_home):
-        self.repository = Repository(db_home)
+    def __init__(self, db_home, cache_size=None):
+        """
+        Open the store in the given directory.
+
+        :param str db_home: the directory of the store
+        :param int cache_size: size of the memory pool in bytes, None to derive it from the size of the store
+        """
+        self.repository = Repository(db_home, cache_size)
         self.__open = True
         self.stores = dict()
         self.store_names = [ViewDateStore.__name__.lower(),
@@ -122,14 +223,16 @@ class Store(object):
     def view_date_store(self) -> ViewDateStore:
         filename = "store/%s.bdb" % ViewDateStore.__name__.lower()
         if filename not in self.stores:
-            vds = ViewDateStore(self.repository.bdb(filename, cache=False))
+            vds = ViewDateStore(self.repository.bdb(filename),
+                                latest=self.repository.bdb("store/%s_latest.bdb" % ViewDateStore.__name__.lower()))
             self.stores[filename] = vds
         return self.stores[filename]
 
     def acme_date_store(self) -> AcmeDateStore:
         filename = "store/%s.bdb" % AcmeDateStore.__name__.lower()
         if filename not in self.stores:
-            ads = AcmeDateStore(self.repository.bdb(filename, cache=False))
+            ads = AcmeDateStore(self.repository.bdb(filename),
+                                latest=self.repository.bdb("store/%s_latest.bdb" % AcmeDateStore.__name__.lower()))
             self.stores[filename] = ads
         return self.stores[filename]
 
@@ -163,8 +266,9 @@ class Store(object):
         filename = os.path.join(rep_dir, name)
         with open(filename, "w", encoding="UTF-8") as f:
             writer = csv.writer(f, dialect=NlDialect)
-            for item in bdb.items_decoded():
-                writer.writerow([item[0], item[1]])
+            for key, value in bdb.iter_items():
+                dates = [date.strftime(DATE_FORMAT) for date in env.unpack_dates(value)]
+                writer.writerow([key, env.LIST_SEP.join(dates)])
         LOG.info("Replicated %s" % filename)
 
     def _cleanup(self, rep_dir):
@@ -1,9 +1,14 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 import logging
+import os
 import sys
+import tempfile
 import unittest
+from datetime import datetime
 
+from bdbs import env
+from bdbs.env import Repository
 from bdbs.store import Store
 
 
@@ -26,3 +31,38 @@ class TestRepository(unittest.TestCase):
         for tup in bdb.get_keys_with_latest_values():
             print(tup[1], tup[0])
 
+    def test_cache_size_for(self):
+        with tempfile.TemporaryDirectory() as db_home:
+            self.assertEqual(env.MIN_CACHE_SIZE, Repository.cache_size_for(db_home))
+            os.makedirs(os.path.join(db_home, "store"))
+            with open(os.path.join(db_home, "store", "viewdatestore.bdb"), "wb") as f:
+                f.truncate(40 * env.MEGABYTE)
+            self.assertEqual(50 * env.MEGABYTE, Repository.cache_size_for(db_home))
+
+
+class TestPackedDates(unittest.TestCase):
+
+    def test_pack_unpack(self):
+        dates = [datetime(2018, 3, 2, 9, 44), datetime(1960, 1, 1, 0, 0, 1), datetime(2018, 3, 3, 9, 44)]
+        value = env.pack_dates(dates)
+        self.assertTrue(env.is_packed(value))
+        self.assertEqual(dates, env.unpack_dates(value))
+        self.assertEqual(3, env.unpack_count(value))
+        self.assertEqual(3, env.unpack_count(value[:env.DATES_HEADER.size]))
+        self.assertEqual(dates[-1], env.unpack_latest(value))
+        self.assertEqual([], env.unpack_dates(None))
+        self.assertEqual(0, env.unpack_count(None))
+
+    def test_text(self):
+        value = b"20180302094400|20180303094400"
+        self.assertFalse(env.is_packed(value))
+        self.assertEqual([datetime(2018, 3, 2, 9, 44), datetime(2018, 3, 3, 9, 44)], env.unpack_dates(value))
+        self.assertEqual(2, env.unpack_count(value))
+        self.assertEqual(datetime(2018, 3, 3, 9, 44), env.unpack_latest(value))
+
+    def test_latest_key(self):
+        keys = [env.latest_key(datetime(2018, 3, 2, 9, 44), "/b.jpg"),
+                env.latest_key(datetime(2017, 12, 31, 23, 59, 59), "/c.jpg"),
+                env.latest_key(datetime(2018, 3, 2, 9, 44), "/a|b.jpg")]
+        self.assertEqual([keys[1], keys[2], keys[0]], sorted(keys))
+        self.assertEqual((datetime(2018, 3, 2, 9, 44), "/a|b.jpg"), env.split_latest_key(keys[2]))
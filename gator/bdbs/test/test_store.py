@@ -3,10 +3,14 @@
 import logging
 import os
 import sys
+import tempfile
 import unittest
+from datetime import datetime
 
-from bdbs.store import Store
+from bdbs import env
+from bdbs.store import Store, ViewDateStore
 from core.services import Format
+from store.obj import Resource
 
 
 class TestViewDateStore(unittest.TestCase):
@@ -74,4 +78,105 @@ class TestViewDateStore(unittest.TestCase):
     #             key2 = key1.replace("/Volumes/Backup/20170412/quinter", "/Volumes/Backup/20171217/quinter")
     #             print(key1, " >  ", key2)
     #             ads.bdb.delete(item[0])
-    #             ads.bdb.put(key2, item[1])
\ No newline at end of file
+    #             ads.bdb.put(key2, item[1])
+
+
+class TestDateStoreOnDisk(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = Store(os.path.join(self.tmp.name, "db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_append_date(self):
+        bdb = self.store.view_date_store().bdb
+        dates = [datetime(2018, 3, 2, 9, 44), datetime(2018, 3, 3, 10, 0, 1), datetime(1969, 7, 20, 20, 17)]
+        self.assertEqual(1, bdb.append_date("/b.jpg", dates[0]))
+        self.assertEqual(2, bdb.append_date("/b.jpg", dates[1]))
+        self.assertEqual(3, bdb.append_date("/b.jpg", dates[2]))
+        self.assertEqual(1, bdb.append_date("/a.jpg", dates[1]))
+
+        self.assertEqual(dates, env.unpack_dates(bdb.get_bytes("/b.jpg")))
+        self.assertEqual(dates[2], bdb.get_latest("/b.jpg"))
+        self.assertEqual(3, self.store.view_date_store().count_dates("/b.jpg"))
+        self.assertEqual(dates, self.store.view_date_store().get_dates_for(Resource("/b.jpg")))
+
+        self.store.view_date_store().add_date_on(Resource("/a.jpg"))
+        self.assertEqual(2, self.store.view_date_store().count_dates("/a.jpg"))
+        self.assertEqual(dates[1], env.unpack_dates(bdb.get_bytes("/a.jpg"))[0])
+
+    def test_iter_items(self):
+        bdb = self.store.view_date_store().bdb
+        for key in ["/b.jpg", "/c.jpg", "/a.jpg", "/b.jpg"]:
+            bdb.append_date(key, datetime(2018, 3, 2))
+        self.assertEqual(["/a.jpg", "/b.jpg", "/c.jpg"], list(bdb.iter_keys()))
+        self.assertEqual([("/c.jpg", 1), ("/b.jpg", 2), ("/a.jpg", 1)],
+                         [(key, len(env.unpack_dates(value))) for key, value in bdb.iter_items(reverse=True)])
+        headers = list(bdb.iter_values(dlen=env.DATES_HEADER.size, doff=0))
+        self.assertEqual([env.DATES_HEADER.size] * 3, [len(header) for header in headers])
+        self.assertEqual([1, 2, 1], [env.unpack_count(header) for header in headers])
+        self.assertEqual({"/a.jpg": 1, "/b.jpg": 2, "/c.jpg": 1}, self.store.view_date_store().count_map())
+        self.assertEqual([("/a.jpg", [datetime(2018, 3, 2)]), ("/b.jpg", [datetime(2018, 3, 2)] * 2),
+                          ("/c.jpg", [datetime(2018, 3, 2)])], bdb.items_decoded())
+        self.assertEqual([1, 2, 1], [len(dates) for dates in bdb.values_decoded()])
+
+    def test_migrate_dates(self):
+        legacy = {"/%d.jpg" % i: "20180302094400|2018030310000%d" % i for i in range(5)}
+        bdb = self.store.repository.bdb("store/acmedatestore.bdb")
+        for key, value in legacy.items():
+            bdb.put(key, value)
+
+        converted, before = bdb.transact(lambda txn: bdb.migrate_dates(txn, None, 2))
+        self.assertEqual((2, b"/3.jpg"), (converted, before))
+        self.assertTrue(env.is_packed(bdb.get_bytes("/4.jpg")))
+        self.assertFalse(env.is_packed(bdb.get_bytes("/2.jpg")))
+        self.assertEqual(3, bdb.migrate_all_dates(batch_size=2))
+        self.assertEqual(0, bdb.migrate_all_dates(batch_size=2))
+
+        for key, value in legacy.items():
+            self.assertTrue(env.is_packed(bdb.get_bytes(key)))
+            self.assertEqual(env.unpack_dates(value.encode("utf-8")), env.unpack_dates(bdb.get_bytes(key)))
+
+    def test_open_legacy_store(self):
+        bdb = self.store.repository.bdb("store/viewdatestore.bdb")
+        bdb.put("/a.jpg", "20180302094400|20180303100000")
+        bdb.put("/b.jpg", "20180301000000")
+        vds = self.store.view_date_store()
+        self.assertEqual([datetime(2018, 3, 2, 9, 44), datetime(2018, 3, 3, 10, 0)],
+                         vds.get_dates_for(Resource("/a.jpg")))
+        self.assertEqual({"/a.jpg": 2, "/b.jpg": 1}, vds.count_map())
+        self.assertTrue(all(env.is_packed(value) for value in bdb.iter_values()))
+        self.assertEqual(["/b.jpg", "/a.jpg"], vds.history_keys())
+
+    def test_latest_index(self):
+        repository = self.store.repository
+        vds = ViewDateStore(repository.bdb("store/test.bdb"), add_once=False,
+                            latest=repository.bdb("store/test_latest.bdb"))
+        for filename in ["/a.jpg", "/b.jpg", "/a.jpg", "/c.jpg", "/a.jpg"]:
+            vds.add_date_on(Resource(filename))
+        vds.bdb.append_date("/b.jpg", datetime(2000, 1, 1))
+        vds.rebuild_latest()
+
+        index = list(vds.latest.iter_items())
+        # one record per key, the records of earlier latest dates are deleted
+        self.assertEqual(3, len(index))
+        for key, value in index:
+            latest, filename = env.split_latest_key(key)
+            self.assertEqual(vds.bdb.get_latest(filename), latest)
+            self.assertEqual(vds.count_dates(filename), env.unpack_count(value))
+        self.assertEqual("/b.jpg", env.split_latest_key(index[0][0])[1])
+
+        vds.add_date_on(Resource("/b.jpg"))
+        self.assertEqual(3, len(list(vds.latest.iter_items())))
+        updated = list(vds.latest.iter_items())
+        vds.rebuild_latest()
+        self.assertEqual(updated, list(vds.latest.iter_items()))
+
+        # a missing index is rebuilt when the store is opened
+        vds.latest.truncate()
+        reopened = ViewDateStore(vds.bdb, latest=vds.latest)
+        self.assertEqual(updated, list(reopened.latest.iter_items()))
+        self.assertEqual([env.split_latest_key(key)[1] for key, value in updated], reopened.history_keys())
@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Collections for sampling items by count.
+"""
+import random
+from bisect import bisect_left, insort
+
+
+class RandomSet(object):
+    """
+    A set that supports adding, discarding and uniform random choice in constant time.
+    """
+
+    def __init__(self, items=()):
+        self.__items = list()
+        self.__positions = dict()
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self.__positions:
+            self.__positions[item] = len(self.__items)
+            self.__items.append(item)
+
+    def discard(self, item):
+        position = self.__positions.pop(item, None)
+        if position is not None:
+            last = self.__items.pop()
+            if position < len(self.__items):
+                self.__items[position] = last
+                self.__positions[last] = position
+
+    def choice(self):
+        return random.choice(self.__items)
+
+    def __contains__(self, item):
+        return item in self.__positions
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __iter__(self):
+        return iter(self.__items)
+
+
+class CountBuckets(object):
+    """
+    Keeps items in buckets by count. Changing the count of an item and choosing a random item with the
+    minimum count are constant time operations, given that the number of distinct counts is small.
+    """
+
+    def __init__(self):
+        self.__buckets = dict()
+        self.__counts = dict()
+        self.__sorted_counts = list()
+
+    def set_count(self, item, count):
+        old = self.__counts.get(item)
+        if old == count:
+            return
+        if old is not None:
+            bucket = self.__buckets[old]
+            bucket.discard(item)
+            if len(bucket) == 0:
+                del self.__buckets[old]
+                del self.__sorted_counts[bisect_left(self.__sorted_counts, old)]
+        self.__counts[item] = count
+        bucket = self.__buckets.get(count)
+        if bucket is None:
+            bucket = self.__buckets[count] = RandomSet()
+            insort(self.__sorted_counts, count)
+        bucket.add(item)
+
+    def count(self, item, default=None):
+        return self.__counts.get(item, default)
+
+    def min_count(self):
+        return self.__sorted_counts[0] if self.__sorted_counts else None
+
+    def min_size(self) -> int:
+        return len(self.__buckets[self.__sorted_counts[0]]) if self.__sorted_counts else 0
+
+    def choice_min(self):
+        """
+        Choose a random item, uniformly distributed over the items with the minimum count.
+
+        :return: an item or `None` if there are no items
+        """
+        return self.__buckets[self.__sorted_counts[0]].choice() if self.__sorted_counts else None
+
+    def __len__(self):
+        return len(self.__counts)
@@ -267,6 +267,30 @@ class GatorConf(Configuration):
     def set_universe_list(self, path_list: list):
         self.__set_list__(GatorConf.SECTION_CORE, "universe_list", path_list)
 
+    def scan_workers(self, fallback=8):
+        return self.__get_int__(GatorConf.SECTION_CORE, "scan_workers", fallback=fallback)
+
+    def set_scan_workers(self, workers):
+        self.__set_int__(GatorConf.SECTION_CORE, "scan_workers", workers)
+
+    def watch_universe(self, fallback=False):
+        return self.__get_boolean__(GatorConf.SECTION_CORE, "watch_universe", fallback=fallback)
+
+    def set_watch_universe(self, watch):
+        self.__set_boolean__(GatorConf.SECTION_CORE, "watch_universe", watch)
+
+    def watch_polling(self, fallback=False):
+        return self.__get_boolean__(GatorConf.SECTION_CORE, "watch_polling", fallback=fallback)
+
+    def set_watch_polling(self, polling):
+        self.__set_boolean__(GatorConf.SECTION_CORE, "watch_polling", polling)
+
+    def watch_interval(self, fallback=30):
+        return self.__get_int__(GatorConf.SECTION_CORE, "watch_interval", fallback=fallback)
+
+    def set_watch_interval(self, seconds):
+        self.__set_int__(GatorConf.SECTION_CORE, "watch_interval", seconds)
+
     #####################################################
     # SECTION_WINDOW
     def main_window_width(self, fallback=500):
@@ -2,10 +2,15 @@
 # -*- coding: utf-8 -*-
 import logging
 import os
-import random
+import weakref
+from bisect import bisect_left, bisect_right, insort
 
 from store.obj import Resource
 from store.store import Store
+from core import watcher
+from core.buckets import CountBuckets
+from core.paths import PathList
+from core.scanner import Scanner, ScanIndex, DEFAULT_WORKERS
 from core.services import Format, Stat
 
 LOG = logging.getLogger(__name__)
@@ -19,44 +24,76 @@ class Universe(object):
     def filter_list():
         return "Images(*%s)" % " *".join(EXTENSIONS)
 
-    def __init__(self, path_list=[]):
+    @staticmethod
+    def is_image(filename) -> bool:
+        return os.path.splitext(filename)[1].lower() in EXTENSIONS
+
+    def __init__(self, path_list=[], workers=DEFAULT_WORKERS, progress=None, index_file=None):
         self.__path_list = path_list
-        self.__filename_list = list()
-        self.__folder_list = list()
-        self.__init_lists__()
-
-    def __init_lists__(self):
-        for path in self.__path_list:
-            for (dir_path, dir_names, filenames) in os.walk(path):
-                for fn in filenames:
-                    if os.path.splitext(fn)[1].lower() in EXTENSIONS:
-                        self.__filename_list.append(os.path.join(dir_path, fn))
-                        if dir_path not in self.__folder_list:
-                            self.__folder_list.append(dir_path)
+        self.__filenames = PathList()
+        self.__common_prefix = None
+        self.__modification_count = 0
+        index = None if index_file is None else ScanIndex(index_file, key=tuple(EXTENSIONS))
+        self.__init_lists__(Scanner(self.__path_list, Universe.is_image, workers, progress, index))
+
+    def __init_lists__(self, scanner: Scanner):
+        for (dir_path, filenames) in scanner.scan():
+            self.__filenames.extend(dir_path, filenames)
 
     def size(self) -> int:
-        return len(self.__filename_list)
+        return len(self.__filenames)
 
     def path_list(self) -> list:
         return list(self.__path_list)
 
     def filename_list(self) -> list:
-        return list(self.__filename_list)
+        """
+        A copy of the list of filenames. Use :meth:`filenames` for read-only access without copying.
+
+        :return: list of filenames
+        """
+        return list(self.__filenames)
+
+    def filenames(self) -> PathList:
+        """
+        Read-only access to the filenames of this universe, without copying.
+
+        :return: the filenames
+        """
+        return self.__filenames
+
+    def contains(self, filename) -> bool:
+        return self.__filenames.position(filename) >= 0
+
+    def __contains__(self, filename):
+        return self.contains(filename)
 
     def folder_list(self) -> list:
-        return list(self.__folder_list)
+        return self.__filenames.dirs()
+
+    def folder_ranges(self, folder) -> list:
+        """
+        The ranges of indexes of the files in the given folder. A folder has more than one range if it is
+        reached from more than one path in the path list.
+
+        :param str folder: the folder
+        :return: list of ranges, empty if the folder has no files in this universe
+        """
+        return self.__filenames.dir_ranges(folder)
 
     def common_prefix(self) -> str:
-        return os.path.dirname(os.path.commonprefix(self.__folder_list))
+        if self.__common_prefix is None:
+            self.__common_prefix = os.path.dirname(os.path.commonprefix(self.__filenames.dirs()))
+        return self.__common_prefix
 
     def paths_count(self) -> int:
         return len(self.__path_list)
 
     def filename_count(self) -> int:
-        return len(self.__filename_list)
+        return len(self.__filenames)
 
     def folder_count(self) -> int:
-        return len(self.__folder_list)
+        return self.__filenames.dir_count()
 
     def to_string(self) -> str:
         return "filenames: %s  |  folders: %s  |  paths: %s" % (
@@ -68,13 +105,84 @@ class Universe(object):
         if index < 0 or index > self.filename_count() - 1:
             return None
         else:
-            return self.__filename_list[index]
+            return self.__filenames[index]
 
     def index(self, filename) -> int:
-        if filename in self.__filename_list:
-            return self.__filename_list.index(filename)
-        else:
-            return -1
+        return self.__filenames.position(filename)
+
+    def modification_count(self) -> int:
+        """
+        The number of times this universe was modified after the initial scan.
+
+        :return: modification count
+        """
+        return self.__modification_count
+
+    def __modified(self):
+        self.__common_prefix = None
+        self.__modification_count += 1
+
+    def add_filename(self, filename) -> bool:
+        """
+        Add the given image file to this universe, after the other files in the same folder.
+
+        :param str filename: the file to add
+        :return: `True` if the file was added, `False` if it is not an image or already in this universe
+        """
+        if not Universe.is_image(filename) or self.contains(filename):
+            return False
+        self.__filenames.add(*os.path.split(filename))
+        self.__modified()
+        return True
+
+    def remove_filename(self, filename) -> bool:
+        """
+        Remove the given file from this universe.
+
+        :param str filename: the file to remove
+        :return: `True` if the file was removed, `False` if it was not in this universe
+        """
+        index = self.__filenames.position(filename)
+        if index < 0:
+            return False
+        while index >= 0:
+            self.__filenames.remove(index)
+            index = self.__filenames.position(filename)
+        self.__modified()
+        return True
+
+    def remove_folder(self, folder) -> bool:
+        """
+        Remove all files in the given folder and the folders below it from this universe.
+
+        :param str folder: the folder to remove
+        :return: `True` if files were removed
+        """
+        removed = False
+        for dir_path in self.__filenames.dirs_under(folder):
+            for r in reversed(self.__filenames.dir_ranges(dir_path)):
+                self.__filenames.remove_range(r.start, r.stop)
+                removed = True
+        if removed:
+            self.__modified()
+        return removed
+
+    def apply(self, events: list) -> bool:
+        """
+        Apply the events of a :class:`core.watcher.Watcher` to this universe.
+
+        :param list events: list of (kind, path)
+        :return: `True` if this universe changed
+        """
+        changed = False
+        for kind, path in events:
+            if kind == watcher.CREATED:
+                changed = self.add_filename(path) or changed
+            elif kind == watcher.DELETED:
+                changed = self.remove_filename(path) or changed
+            elif kind == watcher.FOLDER_DELETED:
+                changed = self.remove_folder(path) or changed
+        return changed
 
 
 class Pilot(object):
@@ -86,6 +194,7 @@ class Pilot(object):
         self._store = store
         self._universe = universe
         self._universe_index = -1
+        self._universe_modification = universe.modification_count()
         self._filename = None
 
     def space(self) -> (int, int):
@@ -116,6 +225,10 @@ class Pilot(object):
         return Stat([])
 
     def universe_index(self) -> int:
+        if self._universe_modification != self._universe.modification_count():
+            self._universe_modification = self._universe.modification_count()
+            if self._filename is not None:
+                self._universe_index = self._universe.index(self._filename)
         return self._universe_index
 
     def index_x(self):
@@ -142,6 +255,24 @@ class Pilot(object):
     def go_right(self) -> Resource or None:
         return None
 
+    def peek(self, n: int=4) -> list:
+        """
+        The filenames this pilot is most likely to travel to next, most likely first.
+
+        :param int n: the maximum number of filenames
+        :return: list of filenames, not including the current filename
+        """
+        return []
+
+    def _peek_list(self, candidates, n: int) -> list:
+        filenames = []
+        for filename in candidates:
+            if len(filenames) >= n:
+                break
+            if filename is not None and filename != self._filename and filename not in filenames:
+                filenames.append(filename)
+        return filenames
+
     def _create_resource_by_index(self, index) -> Resource or None:
         filename = self._universe.filename_by_index(index)
         return self._create_resource(index, filename)
@@ -158,24 +289,138 @@ class Pilot(object):
         self._store.acme_date_store().update(resource)
         self._store.view_date_store().update(resource)
         self._universe_index = index
+        self._universe_modification = self._universe.modification_count()
         self._filename = filename
         return resource
 
 
-class DefaultPilot(Pilot):
+class PilotState(object):
+    """
+    State that is shared by the pilots that travel the same :class:`Universe` with the same :class:`Store`: the
+    minimum view count, the universe indexes in buckets by view count and the acme order. Each part is built on
+    first use and kept up to date by the date stores. Pilots keep their own view history and position.
+
+    Shared states are obtained with :meth:`acquire` and given back with :meth:`release`; a state is dropped when
+    its last reference is released. Only weak references are kept in the shared states, so a state that is never
+    released is dropped together with the last pilot or navigator that uses it.
+    """
+
+    __states = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def acquire(store: Store, universe: Universe) -> 'PilotState':
+        key = (id(store), id(universe))
+        state = PilotState.__states.get(key)
+        if state is None or state.store is not store or state.universe is not universe:
+            state = PilotState(store, universe)
+            PilotState.__states[key] = state
+        state.__references += 1
+        return state
+
+    @staticmethod
+    def shared_count() -> int:
+        return len(PilotState.__states)
 
     def __init__(self, store: Store, universe: Universe):
+        self.store = store
+        self.universe = universe
+        self.__references = 0
+        self.__min_views = None
+        self.__view_buckets = None
+        self.__view_buckets_modification = -1
+        self.__acme_list = None
+        self.__acme_positions = None
+        self.__acme_universe_positions = None
+        self.__acme_universe_positions_modification = -1
+        self.store.view_date_store().add_listener(self._on_view_date_added)
+        self.store.acme_date_store().add_listener(self._on_acme_date_added)
+
+    def release(self):
+        self.__references -= 1
+        key = (id(self.store), id(self.universe))
+        if self.__references <= 0 and PilotState.__states.get(key) is self:
+            del PilotState.__states[key]
+
+    def references(self) -> int:
+        return self.__references
+
+    def min_views(self) -> int:
+        if self.__min_views is None:
+            stat = self.store.view_date_store().stat(total=self.universe.size())
+            self.__min_views = stat.min()
+            LOG.info("view stats: %s" % stat.to_string(join=" | "))
+        return self.__min_views
+
+    def set_min_views(self, min_views: int):
+        self.__min_views = min_views
+
+    def view_buckets(self) -> CountBuckets:
+        """
+        Universe indexes in buckets by view count, rebuilt when the universe was modified.
+        """
+        if self.__view_buckets is None or self.__view_buckets_modification != self.universe.modification_count():
+            counts = self.store.view_date_store().count_map()
+            self.__view_buckets = CountBuckets()
+            for idx, filename in enumerate(self.universe.filenames()):
+                self.__view_buckets.set_count(idx, counts.get(filename, 0))
+            self.__view_buckets_modification = self.universe.modification_count()
+        return self.__view_buckets
+
+    def _on_view_date_added(self, filename, count):
+        if self.__view_buckets is not None:
+            idx = self.universe.index(filename)
+            if idx >= 0:
+                self.__view_buckets.set_count(idx, count)
+
+    def acme_list(self) -> list:
+        """
+        The acme'd files in order of acme date. Files that are acme'd later are appended.
+        """
+        if self.__acme_list is None:
+            self.__acme_list = self.store.acme_date_store().history_keys()
+            self.__acme_positions = {filename: idx for idx, filename in enumerate(self.__acme_list)}
+        return self.__acme_list
+
+    def acme_index(self, filename) -> int:
+        self.acme_list()
+        return self.__acme_positions.get(filename, -1)
+
+    def acme_universe_positions(self) -> list:
+        """
+        Sorted universe indexes of the acme'd files that are in the universe, rebuilt when the universe was
+        modified.
+        """
+        if self.__acme_universe_positions is None \
+                or self.__acme_universe_positions_modification != self.universe.modification_count():
+            positions = (self.universe.index(filename) for filename in self.acme_list())
+            self.__acme_universe_positions = sorted(idx for idx in positions if idx >= 0)
+            self.__acme_universe_positions_modification = self.universe.modification_count()
+        return self.__acme_universe_positions
+
+    def _on_acme_date_added(self, filename, count):
+        if self.__acme_list is None or filename in self.__acme_positions:
+            return
+        self.__acme_positions[filename] = len(self.__acme_list)
+        self.__acme_list.append(filename)
+        if self.__acme_universe_positions is not None:
+            idx = self.universe.index(filename)
+            if idx >= 0:
+                insort(self.__acme_universe_positions, idx)
+
+
+class DefaultPilot(Pilot):
+
+    def __init__(self, store: Store, universe: Universe, state: PilotState=None):
         Pilot.__init__(self, store, universe)
-        self.__size_y = self._universe.size()
-        stat = self.stat()
-        self.__min_views = stat.min()
-        LOG.info("view stats: %s" % stat.to_string(join=" | "))
+        self.__state = PilotState(store, universe) if state is None else state
+        self.__min_views = self.__state.min_views()
 
         self.__resource = self._create_resource(*self._random_()[0:2])
+        self.__next_random = None
 
         self.__history_list = self._store.view_date_store().history_keys(self.__min_views)
         self._store.view_date_store().append_dated(self.__history_list)
-        if len(self.__history_list) >= self.__size_y:
+        if len(self.__history_list) >= self._universe.size():
             self.__history_list.clear()
             self._store.view_date_store().clear_dated()
             LOG.info("Cleared history list")
@@ -183,11 +428,11 @@ class DefaultPilot(Pilot):
         self.__start_index = self.__history_index
 
     def set_filename(self, filename: str):
-        if filename and filename in self._universe.filename_list():
+        if filename and self._universe.contains(filename):
             self.__resource = self._create_resource_by_filename(filename)
 
     def space(self) -> (int, int):
-        return len(self.__history_list), self.__size_y
+        return len(self.__history_list), self._universe.size()
 
     def index_x(self):
         return self.__history_index
@@ -196,7 +441,7 @@ class DefaultPilot(Pilot):
         return self.__start_index
 
     def stat(self) -> Stat:
-        return Stat(self._store.view_date_store().sequence_count(total=self.__size_y))
+        return self._store.view_date_store().stat(total=self._universe.size())
 
     def current_resource(self):
         return self._append_history(self.__resource)
@@ -211,36 +456,67 @@ class DefaultPilot(Pilot):
         return self._history_resource(self.__history_index + 1)
 
     def go_left(self):
-        return self._universe_resource(self._universe_index - 1)
+        return self._universe_resource(self.universe_index() - 1)
 
     def go_right(self):
-        return self._universe_resource(self._universe_index + 1)
+        return self._universe_resource(self.universe_index() + 1)
+
+    def peek(self, n: int=4) -> list:
+        return self._peek_list(self.__peek_candidates(n), n)
+
+    def __peek_candidates(self, n: int):
+        for step in range(1, n + 1):
+            yield self.__history_filename(self.__history_index + step)
+            yield self._universe.filename_by_index(self.universe_index() + step)
+            yield self._universe.filename_by_index(self.universe_index() - step)
+            yield self.__history_filename(self.__history_index - step)
+
+    def __history_filename(self, history_index: int) -> str or None:
+        if 0 <= history_index < len(self.__history_list):
+            return self.__history_list[history_index]
+        elif history_index == len(self.__history_list):
+            if self.__next_random is None:
+                self.__next_random = self._random_()
+                if self.__next_random[1] == self._filename:
+                    self.__next_random = self._random_()
+            return self.__next_random[1]
+        return None
+
+    def __take_random(self) -> (int, str):
+        """
+        The random pick drawn ahead by :meth:`peek`, if it still has the minimum view count, or a new pick.
+        """
+        drawn, self.__next_random = self.__next_random, None
+        if drawn is not None:
+            idx, filename = drawn
+            buckets = self.__state.view_buckets()
+            if self._universe.filename_by_index(idx) == filename and buckets.count(idx) == buckets.min_count():
+                return drawn
+        return self._random_()
 
     def _random_(self) -> (int, str):
-        if self.__size_y > 0:
-            idx = random.randint(0, self.__size_y - 1)
+        buckets = self.__state.view_buckets()
+        idx = buckets.choice_min()
+        if idx is None:
+            return -1, None
+        filename = self._universe.filename_by_index(idx)
+        views = self._store.view_date_store().count_dates(filename)
+        tries = 0
+        while views != buckets.count(idx):
+            # the store has been changed by others, e.g. for a file that is more than once in the universe
+            tries += 1
+            buckets.set_count(idx, views)
+            idx = buckets.choice_min()
             filename = self._universe.filename_by_index(idx)
             views = self._store.view_date_store().count_dates(filename)
-            tries = 0
-            while views > self.__min_views:
-                tries += 1
-                idx += 1
-                if idx >= self.__size_y:
-                    idx = 0
-                    LOG.debug("Recalculating min views")
-                    minimal_views = self.stat().min()
-                    if minimal_views != self.__min_views:
-                        LOG.info("Adjusting min views to %d" % minimal_views)
-                        self.__min_views = minimal_views
-
-                filename = self._universe.filename_by_index(idx)
-                views = self._store.view_date_store().count_dates(filename)
-
-            if tries > 0:
-                LOG.debug("Found filename after %d tries. __min_views=%d" % (tries, self.__min_views))
-            return idx, filename
-        else:
-            return -1, None
+
+        if buckets.min_count() != self.__min_views:
+            LOG.info("Adjusting min views to %d" % buckets.min_count())
+            self.__min_views = buckets.min_count()
+            self.__state.set_min_views(self.__min_views)
+        if tries > 0:
+            LOG.debug("Found filename after %d tries. __min_views=%d" % (tries, self.__min_views))
+        return idx, filename
 
     def _append_history(self, resource: Resource) -> Resource:
         if not resource.filename() in self.__history_list:
@@ -252,7 +528,7 @@ class DefaultPilot(Pilot):
         if self.__history_index < 0:
             self.__history_index = 0
         if self.__history_index >= len(self.__history_list):
-            idx, filename = self._random_()
+            idx, filename = self.__take_random()
             self.__history_list.append(filename)
         if self.__history_index >= len(self.__history_list):
             self.__history_index = len(self.__history_list) - 1
@@ -277,20 +553,19 @@ class DefaultPilot(Pilot):
 
 class AcmePilot(Pilot):
 
-    def __init__(self, store: Store, universe: Universe):
+    def __init__(self, store: Store, universe: Universe, state: PilotState=None):
         Pilot.__init__(self, store, universe)
-        self.__acme_list = self._store.acme_date_store().history_keys()
+        self.__state = PilotState(store, universe) if state is None else state
+        self.__acme_list = self.__state.acme_list()
         self.__acme_index = len(self.__acme_list)
         self.__start_index = self.__acme_index
-        self.__size_y = len(self.__acme_list)
-        sequence = self._store.acme_date_store().sequence_count(total=self.__size_y)
-        stat = Stat(sequence)
+        stat = self.stat()
         LOG.info("acme stats: %s" % stat.to_string(join=" | "))
         self.__resource = None
         self.__resource = self._acme_resource(self.__acme_index)
 
     def space(self) -> (int, int):
-        return self.__size_y, self.__size_y
+        return len(self.__acme_list), len(self.__acme_list)
 
     def index_x(self):
         return self.__acme_index
@@ -299,7 +574,7 @@ class AcmePilot(Pilot):
         return self.__start_index
 
     def stat(self) -> Stat:
-        return Stat(self._store.acme_date_store().sequence_count(total=self.__size_y))
+        return self._store.acme_date_store().stat(total=len(self.__acme_list))
 
     def current_resource(self):
         return self.__resource
@@ -314,25 +589,44 @@ class AcmePilot(Pilot):
         return self._acme_resource(self.__acme_index + 1)
 
     def go_left(self):
-        filename_acme = self.__acme_list[self.__acme_index]
-        idx = self._universe.index(filename_acme) - 1
-
-        for filename in self._universe.filename_list()[idx::-1]:
-            if filename in self.__acme_list:
-                self.__acme_index = self.__acme_list.index(filename)
-                break
+        positions = self.__state.acme_universe_positions()
+        i = bisect_left(positions, self.__current_universe_position()) - 1
+        if i >= 0:
+            self.__acme_index = self.__state.acme_index(self._universe.filename_by_index(positions[i]))
         return self._acme_resource(self.__acme_index)
 
     def go_right(self):
-        filename_acme = self.__acme_list[self.__acme_index]
-        idx = self._universe.index(filename_acme) + 1
-
-        for filename in self._universe.filename_list()[idx::1]:
-            if filename in self.__acme_list:
-                self.__acme_index = self.__acme_list.index(filename)
-                break
+        positions = self.__state.acme_universe_positions()
+        i = bisect_right(positions, self.__current_universe_position())
+        if i < len(positions):
+            self.__acme_index = self.__state.acme_index(self._universe.filename_by_index(positions[i]))
         return self._acme_resource(self.__acme_index)
 
+    def peek(self, n: int=4) -> list:
+        positions = self.__state.acme_universe_positions()
+        current = self.__current_universe_position()
+        left = bisect_left(positions, current) - 1
+        right = bisect_right(positions, current)
+
+        def candidates():
+            for step in range(n):
+                yield self.__acme_filename(self.__acme_index + step + 1)
+                yield self.__acme_filename(self.__acme_index - step - 1)
+                if right + step < len(positions):
+                    yield self._universe.filename_by_index(positions[right + step])
+                if left - step >= 0:
+                    yield self._universe.filename_by_index(positions[left - step])
+
+        return self._peek_list(candidates(), n)
+
+    def __acme_filename(self, acme_index: int) -> str or None:
+        return self.__acme_list[acme_index] if 0 <= acme_index < len(self.__acme_list) else None
+
+    def __current_universe_position(self) -> int:
+        if 0 <= self.__acme_index < len(self.__acme_list):
+            return self._universe.index(self.__acme_list[self.__acme_index])
+        return -1
+
     def _acme_resource(self, acme_index) -> Resource:
         self.__acme_index = acme_index
         if self.__acme_index < 0:
@@ -351,20 +645,40 @@ class Navigator(object):
     PILOTS = ["Default", "Acme"]
 
     def __init__(self, store: Store, universe=Universe(), filename=None):
+        """
+        Initialize a :class:`Navigator`. Pilots are created on first use and share the :class:`PilotState` of
+        other navigators on the same store and universe. Call :meth:`release` when done with this navigator.
+
+        :param Store store: the store
+        :param Universe universe: the universe to travel
+        :param str filename: optional file to start the default pilot with
+        """
         self.__store = store
         self.__universe = universe
+        self.__filename = filename
+        self.__state = PilotState.acquire(store, universe)
+        self.__pilot_name = Navigator.PILOTS[0]
         self.pilots = {}
-        self.pilot = DefaultPilot(store, universe)
-        self.pilot.set_filename(filename)
-        self.pilots[Navigator.PILOTS[0]] = self.pilot
+
+    @property
+    def pilot(self) -> Pilot:
+        if not self.__pilot_name in self.pilots.keys():
+            self.pilots[self.__pilot_name] = self._create_pilot(self.__pilot_name)
+        return self.pilots[self.__pilot_name]
 
     def set_pilot(self, pilot_name: str=None, pilot_index: int=-1):
         if pilot_index >= 0:
             pilot_name = Navigator.PILOTS[pilot_index]
         if pilot_name in Navigator.PILOTS:
-            if not pilot_name in self.pilots.keys():
-                self.pilots[pilot_name] = self._create_pilot(pilot_name)
-            self.pilot = self.pilots[pilot_name]
+            self.__pilot_name = pilot_name
+
+    def release(self):
+        """
+        Release the shared state of this navigator. Pilots that were already created keep working.
+        """
+        if self.__state is not None:
+            self.__state.release()
+            self.__state = None
 
     def space(self) -> (int, int):
         return self.pilot.space()
@@ -402,8 +716,13 @@ class Navigator(object):
     def go_right(self):
         return self.pilot.go_right()
 
+    def peek(self, n: int=4) -> list:
+        return self.pilot.peek(n)
+
     def _create_pilot(self, name: str):
         if name == Navigator.PILOTS[0]:
-            return DefaultPilot(self.__store, self.__universe)
+            pilot = DefaultPilot(self.__store, self.__universe, self.__state)
+            pilot.set_filename(self.__filename)
+            return pilot
         elif name == Navigator.PILOTS[1]:
-            return AcmePilot(self.__store, self.__universe)
+            return AcmePilot(self.__store, self.__universe, self.__state)
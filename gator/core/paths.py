@@ -0,0 +1,345 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact storage for large lists of path names.
+"""
+import os
+from array import array
+from collections.abc import Sequence
+
+import numpy as np
+
+_EMPTY = -1
+_DELETED = -2
+_HASH_MASK = (1 << 64) - 1
+
+
+def _encode(name: str) -> bytes:
+    return name.encode("utf-8", "surrogateescape")
+
+
+def _decode(name: bytes) -> str:
+    return name.decode("utf-8", "surrogateescape")
+
+
+def _shift(positions: array, start: int, delta: int):
+    # positions from start on move by delta; removed entries are negative and stay as they are.
+    view = np.frombuffer(positions, dtype=np.int32)
+    np.add(view, delta, out=view, where=view >= start)
+
+
+class PathList(Sequence):
+    """
+    A read-only sequence of path names, stored compactly. Each directory name is stored once in a directory
+    table; per path only the index of its directory and the offset and length of its base name in a contiguous
+    buffer are stored. Path names are composed on access.
+
+    Besides the position of each path, the ranges of positions of the paths per directory are maintained.
+    Paths can be added to and removed from a :class:`PathList` in place. A :class:`PathList` can be pickled.
+
+    Positions of paths are found with an open addressing hash table of positions over the packed names, kept in
+    an array of four bytes per slot. Adding and removing paths shifts the positions in the table in bulk. The
+    table is built on first use and kept up to date. Bytes of removed names are reclaimed once they outnumber the
+    bytes in use.
+    """
+
+    def __init__(self):
+        self.__dirs = list()
+        self.__dir_ids = dict()
+        self.__dir_ranges = list()
+        self.__dir_count = 0
+        self.__dir_of = array("I")
+        self.__starts = array("I")
+        self.__lengths = array("H")
+        self.__names = bytearray()
+        self.__dead_bytes = 0
+        self.__table = None
+        self.__table_used = 0
+        self.__table_live = 0
+
+    def __getstate__(self):
+        return (self.__dirs, self.__dir_ranges, self.__dir_count, self.__dir_of, self.__starts, self.__lengths,
+                bytes(self.__names))
+
+    def __setstate__(self, state):
+        (self.__dirs, self.__dir_ranges, self.__dir_count, self.__dir_of, self.__starts, self.__lengths,
+         names) = state
+        self.__names = bytearray(names)
+        self.__dead_bytes = len(self.__names) - sum(self.__lengths)
+        self.__dir_ids = dict()
+        for dir_id, dir_path in enumerate(self.__dirs):
+            self.__register_dir(dir_path, dir_id)
+        self.__table = None
+        self.__table_used = 0
+        self.__table_live = 0
+
+    def __register_dir(self, dir_path, dir_id):
+        self.__dir_ids[dir_path] = dir_id
+        # the head of a path composed with this directory, may differ from dir_path in trailing separators.
+        self.__dir_ids.setdefault(os.path.split(os.path.join(dir_path, "_"))[0], dir_id)
+
+    def __dir_id(self, dir_path) -> int:
+        dir_id = self.__dir_ids.get(dir_path)
+        if dir_id is None or self.__dirs[dir_id] != dir_path:
+            dir_id = len(self.__dirs)
+            self.__dirs.append(dir_path)
+            self.__dir_ranges.append([])
+            self.__register_dir(dir_path, dir_id)
+        return dir_id
+
+    def __insert(self, position, dir_id, name):
+        encoded = _encode(name)
+        self.__dir_of.insert(position, dir_id)
+        self.__starts.insert(position, len(self.__names))
+        self.__lengths.insert(position, len(encoded))
+        self.__names.extend(encoded)
+        if self.__table is not None:
+            if position < len(self.__dir_of) - 1:
+                _shift(self.__table, position, 1)
+            self.__put(hash((dir_id, encoded)), position)
+
+    def __build_table(self):
+        size = 8
+        while size * 2 < len(self) * 3:
+            size *= 2
+        self.__table = array("i", [_EMPTY]) * size
+        self.__table_used = 0
+        self.__table_live = 0
+        names = bytes(self.__names)
+        for position in range(len(self)):
+            start = self.__starts[position]
+            self.__put(hash((self.__dir_of[position], names[start:start + self.__lengths[position]])), position)
+
+    def __put(self, key_hash, position):
+        table = self.__table
+        mask = len(table) - 1
+        perturb = key_hash & _HASH_MASK
+        i = perturb & mask
+        while table[i] >= 0:
+            perturb >>= 5
+            i = (i * 5 + perturb + 1) & mask
+        if table[i] == _EMPTY:
+            self.__table_used += 1
+        table[i] = position
+        self.__table_live += 1
+        if self.__table_used * 3 > len(table) * 2:
+            self.__build_table()
+
+    def __drop(self, position):
+        start = self.__starts[position]
+        key_hash = hash((self.__dir_of[position], bytes(self.__names[start:start + self.__lengths[position]])))
+        table = self.__table
+        mask = len(table) - 1
+        perturb = key_hash & _HASH_MASK
+        i = perturb & mask
+        while table[i] != position:
+            perturb >>= 5
+            i = (i * 5 + perturb + 1) & mask
+        table[i] = _DELETED
+        self.__table_live -= 1
+
+    def __compact_names(self):
+        names = bytearray()
+        for index in range(len(self)):
+            start = self.__starts[index]
+            self.__starts[index] = len(names)
+            names.extend(self.__names[start:start + self.__lengths[index]])
+        self.__names = names
+        self.__dead_bytes = 0
+
+    def append(self, dir_path: str, name: str):
+        """
+        Append the path composed of the given directory and name.
+
+        :param str dir_path: the directory
+        :param str name: the base name
+        """
+        dir_id = self.__dir_id(dir_path)
+        position = len(self.__dir_of)
+        ranges = self.__dir_ranges[dir_id]
+        if not ranges:
+            self.__dir_count += 1
+        if ranges and ranges[-1].stop == position:
+            ranges[-1] = range(ranges[-1].start, position + 1)
+        else:
+            ranges.append(range(position, position + 1))
+        self.__insert(position, dir_id, name)
+
+    def extend(self, dir_path: str, names: list):
+        for name in names:
+            self.append(dir_path, name)
+
+    def add(self, dir_path: str, name: str) -> int:
+        """
+        Add the path composed of the given directory and name after the last path in the same directory,
+        or at the end if this list has no paths in the directory. Positions of paths after the added path
+        shift by one.
+
+        :param str dir_path: the directory
+        :param str name: the base name
+        :return: the position of the added path
+        """
+        dir_id = self.__dir_id(dir_path)
+        ranges = self.__dir_ranges[dir_id]
+        if not ranges:
+            self.append(dir_path, name)
+            return len(self) - 1
+        position = ranges[-1].stop
+        for other in self.__dir_ranges:
+            for i, r in enumerate(other):
+                if r.start >= position:
+                    other[i] = range(r.start + 1, r.stop + 1)
+        ranges[-1] = range(ranges[-1].start, position + 1)
+        self.__insert(position, dir_id, name)
+        return position
+
+    def remove(self, position):
+        """
+        Remove the path at the given position. Positions of paths after the removed path shift by one.
+
+        :param int position: the position of the path to remove
+        """
+        self.remove_range(position, position + 1)
+
+    def remove_range(self, start, stop):
+        """
+        Remove the paths at positions start up to stop. Positions of paths after the removed paths shift.
+
+        :param int start: the position of the first path to remove
+        :param int stop: the position after the last path to remove
+        """
+        if stop <= start:
+            return
+
+        def shift(x):
+            return x if x <= start else (start if x <= stop else x - (stop - start))
+
+        if self.__table is not None:
+            if stop - start > self.__table_live // 2:
+                self.__table = None
+            else:
+                for position in range(start, stop):
+                    self.__drop(position)
+                _shift(self.__table, stop, start - stop)
+        self.__dead_bytes += sum(self.__lengths[start:stop])
+        del self.__dir_of[start:stop]
+        del self.__starts[start:stop]
+        del self.__lengths[start:stop]
+        for ranges in self.__dir_ranges:
+            if not ranges:
+                continue
+            ranges[:] = [shifted for shifted in (range(shift(r.start), shift(r.stop)) for r in ranges) if shifted]
+            if not ranges:
+                self.__dir_count -= 1
+        if self.__dead_bytes > len(self.__names) // 2:
+            self.__compact_names()
+
+    def name(self, index) -> str:
+        start = self.__starts[index]
+        return _decode(self.__names[start:start + self.__lengths[index]])
+
+    def dir_name(self, index) -> str:
+        return self.__dirs[self.__dir_of[index]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError("PathList index out of range")
+        return os.path.join(self.dir_name(index), self.name(index))
+
+    def __len__(self):
+        return len(self.__dir_of)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __contains__(self, path):
+        return self.position(path) >= 0
+
+    def index(self, path, start=0, stop=None) -> int:
+        index = self.position(path)
+        if index < 0:
+            raise ValueError("%s is not in list" % path)
+        if index < start or (stop is not None and index >= stop):
+            return super().index(path, start, stop)
+        return index
+
+    def position(self, path) -> int:
+        """
+        The position of the first occurrence of the given path.
+
+        :param str path: the path
+        :return: position of the path or -1 if this list does not contain the path
+        """
+        if not isinstance(path, str):
+            return -1
+        dir_path, name = os.path.split(path)
+        dir_id = self.__dir_ids.get(dir_path)
+        if dir_id is None:
+            return -1
+        if self.__table is None:
+            self.__build_table()
+        encoded = _encode(name)
+        length = len(encoded)
+        table = self.__table
+        mask = len(table) - 1
+        perturb = hash((dir_id, encoded)) & _HASH_MASK
+        i = perturb & mask
+        found = -1
+        # a path that is in this list more than once has more slots, so probe on to the first empty slot
+        while table[i] != _EMPTY:
+            index = table[i]
+            if index >= 0:
+                if self.__dir_of[index] == dir_id and self.__lengths[index] == length and (found < 0 or index < found):
+                    start = self.__starts[index]
+                    if self.__names[start:start + length] == encoded:
+                        found = index
+            perturb >>= 5
+            i = (i * 5 + perturb + 1) & mask
+        return found
+
+    def dirs(self) -> list:
+        """
+        The directories of the paths in this list, in order of first appearance.
+
+        :return: list of directories
+        """
+        return [dir_path for dir_path, ranges in zip(self.__dirs, self.__dir_ranges) if ranges]
+
+    def dir_count(self) -> int:
+        return self.__dir_count
+
+    def dir_ranges(self, dir_path) -> list:
+        """
+        The ranges of positions of the paths in the given directory.
+
+        :param str dir_path: the directory
+        :return: list of ranges, empty if this list has no paths in the directory
+        """
+        dir_id = self.__dir_ids.get(dir_path)
+        return [] if dir_id is None else list(self.__dir_ranges[dir_id])
+
+    def dirs_under(self, dir_path) -> list:
+        """
+        The given directory and the directories below it that have paths in this list.
+
+        :param str dir_path: the top directory
+        :return: list of directories
+        """
+        prefix = os.path.join(dir_path, "")
+        return [d for d in self.dirs() if d == dir_path or d.startswith(prefix)]
+
+    def nbytes(self) -> int:
+        """
+        The number of bytes used by the buffers and the index of this list, not counting the directory table.
+
+        :return: number of bytes
+        """
+        index_bytes = 0 if self.__table is None else self.__table.itemsize * len(self.__table)
+        return (len(self.__names) + self.__dir_of.itemsize * len(self.__dir_of)
+                + self.__starts.itemsize * len(self.__starts) + self.__lengths.itemsize * len(self.__lengths)
+                + index_bytes)
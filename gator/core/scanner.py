@@ -0,0 +1,252 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scanning of directory trees with a pool of worker threads, optionally backed by a persistent :class:`ScanIndex`.
+"""
+import logging
+import os
+import pickle
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LOG = logging.getLogger(__name__)
+
+#: Default number of worker threads used by a :class:`Scanner`.
+DEFAULT_WORKERS = 8
+
+#: Directories modified less than this many nanoseconds before a scan started are listed again on the next scan.
+#: Their modification time may not have changed after a change within the same clock tick.
+MTIME_MARGIN_NS = 2 * 1000000000
+
+
+class Listing(object):
+    """
+    The listing of a single directory: the names of the files and the names of the subdirectories it contains,
+    in the order the file system reported them, and the modification time of the directory at listing time.
+    """
+
+    __slots__ = ("mtime", "files", "dirs")
+
+    def __init__(self, mtime=0, files=None, dirs=None):
+        self.mtime = mtime
+        self.files = [] if files is None else files
+        self.dirs = [] if dirs is None else dirs
+
+    def __getstate__(self):
+        return self.mtime, self.files, self.dirs
+
+    def __setstate__(self, state):
+        self.mtime, self.files, self.dirs = state
+
+
+def list_dir(path, accept=None, previous: Listing=None, trusted_before=0) -> Listing or None:
+    """
+    List the given directory with :func:`os.scandir`. The same entries are reported and skipped as
+    :func:`os.walk` with default arguments would: symbolic links to directories are reported as directories,
+    but will not be followed.
+
+    If a previous listing is given, its modification time equals the current modification time of the directory
+    and it is older than `trusted_before`, the previous listing is returned without listing the directory again.
+
+    :param str path: the directory to list
+    :param accept: optional callable that decides on file names to keep
+    :param Listing previous: optional previous listing of the directory
+    :param int trusted_before: modification time in nanoseconds before which previous listings can be trusted
+    :return: the :class:`Listing` of the directory or `None` if it could not be listed
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError as err:
+        LOG.debug("Unable to stat %s: %s" % (path, err))
+        return None
+    if previous is not None and previous.mtime == mtime and mtime < trusted_before:
+        return previous
+    listing = Listing(mtime)
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    try:
+                        if not entry.is_symlink():
+                            listing.dirs.append(entry.name)
+                    except OSError:
+                        pass
+                elif accept is None or accept(entry.name):
+                    listing.files.append(entry.name)
+    except OSError as err:
+        LOG.debug("Unable to list %s: %s" % (path, err))
+        return None
+    return listing
+
+
+class ScanIndex(object):
+    """
+    Persists the directory listings of a scan on the file system, so that the next scan only needs to list
+    directories that have been modified in the mean time. An index without filename is kept in memory only.
+    """
+
+    VERSION = 1
+
+    def __init__(self, filename, key=None):
+        """
+        Initialize a :class:`ScanIndex` and load it from the file system if the file exists.
+
+        :param str filename: the file the index is stored in, `None` for an index in memory
+        :param key: identifies the way listings were filtered; an index stored with another key is discarded
+        """
+        self.filename = filename
+        self.key = key
+        self.scan_time = 0
+        self.listings = dict()
+        self.load()
+
+    def load(self):
+        if self.filename is None or not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, "rb") as f:
+                version, key, scan_time, listings = pickle.load(f)
+            if version == ScanIndex.VERSION and key == self.key:
+                self.scan_time = scan_time
+                self.listings = listings
+            else:
+                LOG.info("Discarding outdated scan index %s" % self.filename)
+        except Exception as err:
+            LOG.warning("Unable to read scan index %s: %s" % (self.filename, err))
+
+    def trusted_before(self) -> int:
+        """
+        Listings of directories that were modified before the returned time can be trusted.
+
+        :return: time in nanoseconds
+        """
+        return self.scan_time - MTIME_MARGIN_NS
+
+    def update(self, listings: dict, scan_time: int):
+        self.listings = listings
+        self.scan_time = scan_time
+
+    def save(self):
+        if self.filename is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        tmp_file = "%s.tmp" % self.filename
+        with open(tmp_file, "wb") as f:
+            pickle.dump((ScanIndex.VERSION, self.key, self.scan_time, self.listings), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.filename)
+        LOG.info("Saved scan index %s" % self.filename)
+
+
+class Scanner(object):
+    """
+    Scans directory trees. Each directory is listed as a separate task on a thread pool, so that roots and
+    subtrees are scanned in parallel. After scanning, the results are merged in the same deterministic order
+    :func:`os.walk` would yield them: per directory first its files and then, depth first, its subdirectories.
+
+    If the scanner has a :class:`ScanIndex`, directories that were not modified since the previous scan
+    are taken from the index and the index is saved after the scan.
+    """
+
+    def __init__(self, path_list, accept=None, workers=DEFAULT_WORKERS, progress=None, index: ScanIndex=None):
+        """
+        Initialize a :class:`Scanner`.
+
+        :param list path_list: the roots to scan
+        :param accept: optional callable that decides on file names to keep
+        :param int workers: the number of worker threads
+        :param progress: optional callable that receives (directories visited, files found) while scanning
+        :param ScanIndex index: optional index with the listings of a previous scan
+        """
+        self.__path_list = path_list
+        self.__accept = accept
+        self.__workers = max(1, workers)
+        self.__progress = progress
+        self.__index = index
+        self.__listings = dict()
+        self.__listed_count = 0
+
+    def listed_count(self) -> int:
+        """
+        The number of directories that were actually listed during the last scan.
+
+        :return: number of directories listed
+        """
+        return self.__listed_count
+
+    def listings(self) -> dict:
+        """
+        The listings of all directories encountered in the last scan.
+
+        :return: dict of directory path to :class:`Listing`
+        """
+        return self.__listings
+
+    def scan(self) -> iter:
+        """
+        Scan all roots and yield (directory path, file names) for each directory, in walk order.
+
+        :return: generator of (directory path, list of file names)
+        """
+        self.__listings = dict()
+        self.__listed_count = 0
+        scan_time = time.time_ns()
+        previous = dict() if self.__index is None else self.__index.listings
+        trusted_before = 0 if self.__index is None else self.__index.trusted_before()
+        done = queue.Queue()
+        with ThreadPoolExecutor(max_workers=self.__workers, thread_name_prefix="scanner") as executor:
+            submitted = set()
+
+            def submit(dir_path):
+                if dir_path not in submitted:
+                    submitted.add(dir_path)
+                    future = executor.submit(list_dir, dir_path, self.__accept, previous.get(dir_path),
+                                             trusted_before)
+                    future.add_done_callback(lambda f: done.put((dir_path, f)))
+
+            for path in self.__path_list:
+                submit(path)
+            dirs_visited = 0
+            files_found = 0
+            while dirs_visited < len(submitted):
+                path, future = done.get()
+                dirs_visited += 1
+                listing = future.result()
+                if listing is not None:
+                    if listing is not previous.get(path):
+                        self.__listed_count += 1
+                    self.__listings[path] = listing
+                    files_found += len(listing.files)
+                    for name in listing.dirs:
+                        submit(os.path.join(path, name))
+                if self.__progress:
+                    self.__progress(dirs_visited, files_found)
+        LOG.debug("Scanned %d directories with %d workers, listed %d" %
+                  (len(self.__listings), self.__workers, self.__listed_count))
+        if self.__index is not None:
+            self.__index.update(self.__listings, scan_time)
+            try:
+                self.__index.save()
+            except OSError as err:
+                LOG.warning("Unable to save scan index %s: %s" % (self.__index.filename, err))
+        return self.walk()
+
+    def walk(self) -> iter:
+        """
+        Yield (directory path, file names) for each directory of the last scan, in walk order.
+
+        :return: generator of (directory path, list of file names)
+        """
+        for root in self.__path_list:
+            stack = [root]
+            while stack:
+                path = stack.pop()
+                listing = self.__listings.get(path)
+                if listing is None:
+                    continue
+                yield path, listing.files
+                stack.extend(os.path.join(path, name) for name in reversed(listing.dirs))
@@ -1,10 +1,15 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 import csv
+import math
 import os
 import sys
+from collections import OrderedDict
+from fractions import Fraction
 from statistics import mean, harmonic_mean, median, median_low, median_high, stdev, pstdev
 
+import numpy as np
+
 
 def application_home():
     if getattr(sys, 'frozen', False):
@@ -33,9 +38,28 @@ class Format(object):
 
 
 class Stat(object):
+    """
+    Statistics of a sequence of numbers. A sequence of integers is reduced to a histogram with numpy; the
+    statistics are computed from the histogram. Other sequences are handled by the statistics module.
+    """
+
+    def __init__(self, sequence, total=0):
+        """
+        Create a Stat for the given sequence, extended up to total with zero's if total greater than the
+        length of the sequence. The zero's are not materialized.
+        :param sequence: sequence of numbers
+        :param total: the total
+        """
+        array = np.asarray(sequence)
+        if array.size > 0 and array.dtype.kind in "iu":
+            values, frequencies = np.unique(array, return_counts=True)
+            self.__init_histogram(dict(zip(values.tolist(), frequencies.tolist())), total)
+            return
 
-    def __init__(self, sequence):
-        self.__sequence = sequence
+        self.__sequence = list(sequence)
+        if total > len(self.__sequence):
+            self.__sequence.extend([0] * (total - len(self.__sequence)))
+        self.__histogram = None
         self.__len_seq = len(self.__sequence)
         empty = self.__len_seq == 0
         self.__min = 0 if empty else min(self.__sequence)
@@ -46,6 +70,70 @@ class Stat(object):
         self.__median = 0 if empty else median(self.__sequence)
         self.__stdev = -1 if len(self.__sequence) < 2 else stdev(self.__sequence)
 
+    @classmethod
+    def from_histogram(cls, histogram: dict, total=0) -> 'Stat':
+        """
+        Create a Stat for a sequence of integers, given as a histogram of value to frequency. The sequence is
+        extended up to total with zero's if total greater than the length of the sequence.
+        The cost depends on the number of distinct values, not on the length of the sequence.
+        :param histogram: dict of value to frequency
+        :param total: the total
+        :return: Stat equal to the Stat of the sequence
+        """
+        stat = cls.__new__(cls)
+        stat.__init_histogram(histogram, total)
+        return stat
+
+    def __init_histogram(self, histogram: dict, total):
+        histogram = {value: frequency for value, frequency in histogram.items() if frequency > 0}
+        len_seq = sum(histogram.values())
+        if total > len_seq:
+            histogram[0] = histogram.get(0, 0) + total - len_seq
+            len_seq = total
+        values = sorted(histogram)
+        empty = len_seq == 0
+
+        self.__sequence = None
+        self.__histogram = histogram
+        self.__len_seq = len_seq
+        self.__min = 0 if empty else values[0]
+        self.__len_min = 0 if empty else histogram[values[0]]
+        self.__max = 0 if empty else values[-1]
+        self.__len_max = 0 if empty else histogram[values[-1]]
+        sum_values = sum(value * frequency for value, frequency in histogram.items())
+        sum_squares = sum(value * value * frequency for value, frequency in histogram.items())
+        if empty:
+            self.__mean = 0
+        else:
+            # same types as statistics.mean: int if the mean is integral, float otherwise.
+            mean_value = Fraction(sum_values, len_seq)
+            self.__mean = int(mean_value) if mean_value.denominator == 1 else float(mean_value)
+        self.__median = 0 if empty else Stat.__median_of_histogram(histogram, values, len_seq)
+        if len_seq < 2:
+            self.__stdev = -1
+        else:
+            variance = Fraction(len_seq * sum_squares - sum_values * sum_values, len_seq * (len_seq - 1))
+            self.__stdev = math.sqrt(variance)
+
+    @staticmethod
+    def __median_of_histogram(histogram, values, len_seq):
+        low, high = None, None
+        seen = 0
+        for value in values:
+            seen += histogram[value]
+            if low is None and seen > (len_seq - 1) // 2:
+                low = value
+            if seen > len_seq // 2:
+                high = value
+                break
+        return low if len_seq % 2 == 1 else (low + high) / 2
+
+    def __values(self):
+        if self.__sequence is None:
+            self.__sequence = [value for value in sorted(self.__histogram)
+                               for _ in range(self.__histogram[value])]
+        return self.__sequence
+
     def len_seq(self):
         return self.__len_seq
 
@@ -65,22 +153,22 @@ class Stat(object):
         return self.__mean
 
     def harmonic_mean(self):
-        return harmonic_mean(self.__sequence)
+        return harmonic_mean(self.__values())
 
     def median(self):
         return self.__median
 
     def median_low(self):
-        return median_low(self.__sequence)
+        return median_low(self.__values())
 
     def median_high(self):
-        return median_high(self.__sequence)
+        return median_high(self.__values())
 
     def stdev(self):
         return self.__stdev
 
     def pstdev(self):
-        return pstdev(self.__sequence)
+        return pstdev(self.__values())
 
     def to_dict(self):
         return { "len_seq": self.__len_seq,
@@ -99,6 +187,113 @@ class Stat(object):
              self.to_dict().items()])
 
 
+class CountStat(object):
+    """
+    Keeps the count per key and a histogram of those counts. Incrementing the count of a key is a constant
+    time operation; a Stat of the counts is created from the histogram.
+    """
+
+    def __init__(self, count_map: dict=None):
+        self.__counts = dict()
+        self.__histogram = dict()
+        if count_map is not None:
+            for key, count in count_map.items():
+                self.__counts[key] = count
+                self.__histogram[count] = self.__histogram.get(count, 0) + 1
+
+    def increment(self, key) -> int:
+        """
+        Increment the count of the given key.
+        :param key: the key
+        :return: the new count of the key
+        """
+        old = self.__counts.get(key, 0)
+        if old > 0:
+            self.__histogram[old] -= 1
+            if self.__histogram[old] == 0:
+                del self.__histogram[old]
+        count = old + 1
+        self.__counts[key] = count
+        self.__histogram[count] = self.__histogram.get(count, 0) + 1
+        return count
+
+    def count(self, key) -> int:
+        return self.__counts.get(key, 0)
+
+    def histogram(self) -> dict:
+        return dict(self.__histogram)
+
+    def __len__(self):
+        return len(self.__counts)
+
+    def stat(self, total=0) -> Stat:
+        """
+        Gives the Stat of the counts, extended up to total with zero's.
+        :param total: the total
+        :return: Stat of the counts
+        """
+        return Stat.from_histogram(self.__histogram, total)
+
+
+class LruCache(object):
+    """
+    Keeps values up to a maximum total size, dropping the least recently used values first. The size of a value
+    is given by the sizeof function.
+    """
+
+    def __init__(self, max_size: int, sizeof=len):
+        self.__max_size = max_size
+        self.__sizeof = sizeof
+        self.__items = OrderedDict()
+        self.__size = 0
+
+    def get(self, key, default=None):
+        item = self.__items.get(key)
+        if item is None:
+            return default
+        self.__items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value) -> bool:
+        """
+        Put the given value in this cache. Values larger than the maximum size are not cached.
+        :param key: the key
+        :param value: the value
+        :return: `True` if the value was cached
+        """
+        self.discard(key)
+        size = self.__sizeof(value)
+        if size > self.__max_size:
+            return False
+        self.__items[key] = (value, size)
+        self.__size += size
+        while self.__size > self.__max_size:
+            _, (_, dropped) = self.__items.popitem(last=False)
+            self.__size -= dropped
+        return True
+
+    def discard(self, key):
+        item = self.__items.pop(key, None)
+        if item is not None:
+            self.__size -= item[1]
+
+    def clear(self):
+        self.__items.clear()
+        self.__size = 0
+
+    def size(self) -> int:
+        return self.__size
+
+    def max_size(self) -> int:
+        return self.__max_size
+
+    def __contains__(self, key):
+        return key in self.__items
+
+    def __len__(self):
+        return len(self.__items)
+
+
 class NlDialect(object):
     delimiter = ';'
     quotechar = '"'
@@ -0,0 +1,46 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+from collections import Counter
+
+from core.buckets import RandomSet, CountBuckets
+
+
+class TestRandomSet(unittest.TestCase):
+
+    def test_add_discard(self):
+        random_set = RandomSet(range(5))
+        random_set.add(3)
+        self.assertEqual(5, len(random_set))
+        random_set.discard(0)
+        random_set.discard(4)
+        random_set.discard(7)
+        self.assertEqual({1, 2, 3}, set(random_set))
+        self.assertNotIn(0, random_set)
+        self.assertIn(random_set.choice(), {1, 2, 3})
+
+
+class TestCountBuckets(unittest.TestCase):
+
+    def test_min(self):
+        buckets = CountBuckets()
+        self.assertIsNone(buckets.choice_min())
+        self.assertIsNone(buckets.min_count())
+        for item in range(10):
+            buckets.set_count(item, item % 3)
+        self.assertEqual(0, buckets.min_count())
+        self.assertEqual(4, buckets.min_size())
+        for item in [0, 3, 6, 9]:
+            buckets.set_count(item, buckets.count(item) + 1)
+        self.assertEqual(1, buckets.min_count())
+        self.assertEqual(7, buckets.min_size())
+        self.assertEqual(10, len(buckets))
+
+    def test_uniform(self):
+        buckets = CountBuckets()
+        for item in range(6):
+            buckets.set_count(item, 0 if item < 3 else 1)
+        counter = Counter(buckets.choice_min() for _ in range(3000))
+        self.assertEqual({0, 1, 2}, set(counter))
+        for item in range(3):
+            self.assertGreater(counter[item], 800)
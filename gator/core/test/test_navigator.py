@@ -1,13 +1,74 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
+import gc
 import logging
 import os
+import pickle
 import shutil
 import sys
+import tempfile
 import unittest
 
+from store.obj import Resource
 from store.store import Store
-from core.navigator import Universe, DefaultPilot, Navigator
+from core.navigator import Universe, AcmePilot, DefaultPilot, Navigator, PilotState
+
+
+class TestUniverse(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for folder in ["a", "b", os.path.join("b", "c")]:
+            os.makedirs(os.path.join(self.tmp.name, folder))
+            for fn in ["1.jpg", "2.png", "3.txt"]:
+                open(os.path.join(self.tmp.name, folder, fn), "w").close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_index(self):
+        universe = Universe([self.tmp.name, os.path.join(self.tmp.name, "b")])
+        self.assertEqual(10, universe.size())
+        for idx, filename in enumerate(universe.filename_list()[:6]):
+            self.assertEqual(idx, universe.index(filename))
+            self.assertTrue(universe.contains(filename))
+            self.assertEqual(filename, universe.filename_by_index(idx))
+        self.assertEqual(-1, universe.index(os.path.join(self.tmp.name, "a", "3.txt")))
+        self.assertFalse(os.path.join(self.tmp.name, "a", "3.txt") in universe)
+
+    def test_folders(self):
+        b = os.path.join(self.tmp.name, "b")
+        universe = Universe([self.tmp.name, b])
+        folders = [os.path.join(self.tmp.name, "a"), b, os.path.join(b, "c")]
+        self.assertEqual(folders, sorted(universe.folder_list()))
+        self.assertEqual(3, universe.folder_count())
+        ranges = universe.folder_ranges(b)
+        self.assertEqual(2, len(ranges))
+        self.assertEqual(4, sum(len(r) for r in ranges))
+        for r in ranges:
+            for idx in r:
+                self.assertEqual(b, os.path.dirname(universe.filename_by_index(idx)))
+        self.assertEqual([], universe.folder_ranges(self.tmp.name))
+        self.assertEqual(self.tmp.name, universe.common_prefix())
+        self.assertEqual("", Universe([]).common_prefix())
+
+    def test_filenames(self):
+        universe = Universe([self.tmp.name])
+        filenames = universe.filenames()
+        self.assertEqual(universe.filename_list(), list(filenames))
+        self.assertEqual(universe.size(), len(filenames))
+        self.assertEqual(universe.filename_list()[3::-1], filenames[3::-1])
+        self.assertEqual(2, filenames.index(filenames[2]))
+        self.assertIn(filenames[5], filenames)
+        with self.assertRaises(ValueError):
+            filenames.index("not in universe")
+
+    def test_pickle(self):
+        universe = Universe([self.tmp.name])
+        reloaded = pickle.loads(pickle.dumps(universe))
+        self.assertEqual(universe.filename_list(), reloaded.filename_list())
+        self.assertEqual(universe.folder_list(), reloaded.folder_list())
+        self.assertEqual(4, reloaded.index(universe.filename_by_index(4)))
 
 
 class TestDefaultPilot(unittest.TestCase):
@@ -64,6 +125,105 @@ class TestDefaultPilot(unittest.TestCase):
         self.assertEqual(0, pilot.start_index())
 
 
+class TestAcmePilot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for folder in ["a", "b"]:
+            os.makedirs(os.path.join(self.tmp.name, folder))
+            for fn in ["1.jpg", "2.jpg", "3.jpg"]:
+                open(os.path.join(self.tmp.name, folder, fn), "w").close()
+        self.universe = Universe([self.tmp.name])
+        self.store = Store(os.path.join(self.tmp.name, "db"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_left_right(self):
+        filenames = self.universe.filename_list()
+        for idx in [4, 1, 3]:
+            self.store.acme_date_store().add_date_on(Resource(filenames[idx]))
+        pilot = AcmePilot(self.store, self.universe)
+        self.assertEqual(filenames[3], pilot.current_resource().filename())
+        self.assertEqual(filenames[4], pilot.go_right().filename())
+        self.assertEqual(filenames[4], pilot.go_right().filename())
+        self.assertEqual(filenames[3], pilot.go_left().filename())
+        self.assertEqual(filenames[1], pilot.go_left().filename())
+        self.assertEqual(filenames[1], pilot.go_left().filename())
+
+        self.store.acme_date_store().add_date_on(Resource(filenames[2]))
+        self.assertEqual((4, 4), pilot.space())
+        self.assertEqual(filenames[2], pilot.go_right().filename())
+        self.assertEqual(filenames[3], pilot.go_right().filename())
+
+    def test_peek(self):
+        filenames = self.universe.filename_list()
+        for idx in [4, 1, 3]:
+            self.store.acme_date_store().add_date_on(Resource(filenames[idx]))
+        pilot = AcmePilot(self.store, self.universe)
+        self.assertEqual([filenames[1], filenames[4]], pilot.peek(4))
+
+        pilot = DefaultPilot(self.store, self.universe)
+        pilot.current_resource()
+        peeked = pilot.peek(3)
+        self.assertEqual(3, len(peeked))
+        self.assertNotIn(pilot.filename(), peeked)
+        self.assertEqual(peeked[0], pilot.go_down().filename())
+
+    def test_empty_acme_store(self):
+        navigator = Navigator(self.store, self.universe)
+        navigator.set_pilot("Acme")
+        resource = navigator.current_resource()
+        self.assertIsNone(resource.filename())
+        self.assertEqual(-1, resource.index())
+        self.assertEqual((0, 0), navigator.space())
+        navigator.release()
+
+    def test_shared_state(self):
+        filenames = self.universe.filename_list()
+        self.store.acme_date_store().add_date_on(Resource(filenames[4]))
+        navigator1 = Navigator(self.store, self.universe)
+        navigator2 = Navigator(self.store, self.universe)
+        state = PilotState.acquire(self.store, self.universe)
+        self.assertEqual(3, state.references())
+
+        navigator1.set_pilot("Acme")
+        navigator2.set_pilot("Acme")
+        self.store.acme_date_store().add_date_on(Resource(filenames[0]))
+        self.assertEqual((2, 2), navigator1.space())
+        self.assertEqual((2, 2), navigator2.space())
+        self.assertEqual(filenames[0], navigator2.go_left().filename())
+
+        navigator1.set_pilot("Default")
+        navigator2.set_pilot("Default")
+        navigator1.current_resource()
+        navigator1.go_down()
+        self.assertEqual(2, navigator1.space()[0])
+        self.assertEqual(1, navigator1.index_x())
+        self.assertEqual(0, navigator2.space()[0])
+        self.assertEqual(0, navigator2.index_x())
+        self.assertIs(state.view_buckets(), state.view_buckets())
+
+        navigator1.release()
+        navigator1.release()
+        navigator2.release()
+        self.assertEqual(1, state.references())
+        state.release()
+        self.assertIsNot(state, PilotState.acquire(self.store, self.universe))
+
+    def test_unreleased_state(self):
+        gc.collect()
+        count = PilotState.shared_count()
+        navigator = Navigator(self.store, self.universe)
+        navigator.set_pilot("Acme")
+        navigator.current_resource()
+        self.assertEqual(count + 1, PilotState.shared_count())
+
+        del navigator
+        gc.collect()
+        self.assertEqual(count, PilotState.shared_count())
+
+
 class TestNavigator(unittest.TestCase):
 
     def setUp(self):
@@ -74,10 +234,8 @@ class TestNavigator(unittest.TestCase):
 
     def test_navigator(self):
         navigator = Navigator(self.store, self.universe)
+        self.assertEqual({}, navigator.pilots)
 
-        print(navigator.pilots["Default"])
-
-        #print(navigator.pilots["Default"](self.store, self.universe))
-
-
-
+        self.assertIs(navigator.pilot, navigator.pilots["Default"])
+        self.assertIsInstance(navigator.pilot, DefaultPilot)
+        navigator.release()
@@ -0,0 +1,129 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import pickle
+import sys
+import unittest
+
+from core.paths import PathList
+
+
+class TestPathList(unittest.TestCase):
+
+    def setUp(self):
+        self.path_list = PathList()
+        self.paths = []
+        for d in range(10):
+            dir_path = "/Volumes/Backup/photos/2018/%02d" % d
+            names = ["IMG_%04d.jpg" % n for n in range(100)]
+            self.path_list.extend(dir_path, names)
+            self.paths.extend(os.path.join(dir_path, name) for name in names)
+
+    def test_sequence(self):
+        self.assertEqual(len(self.paths), len(self.path_list))
+        self.assertEqual(self.paths, list(self.path_list))
+        self.assertEqual(self.paths[-1], self.path_list[-1])
+        self.assertEqual(self.paths[550::-3], self.path_list[550::-3])
+        self.assertEqual(self.paths[-1000], self.path_list[-1000])
+        with self.assertRaises(IndexError):
+            self.path_list[-1001]
+        with self.assertRaises(IndexError):
+            self.path_list[1000]
+
+    def test_position(self):
+        for idx, path in enumerate(self.paths):
+            self.assertEqual(idx, self.path_list.position(path))
+            self.assertEqual(idx, self.path_list.index(path))
+            self.assertIn(path, self.path_list)
+        self.assertEqual(-1, self.path_list.position("/Volumes/Backup/photos/2018/03/IMG_9999.jpg"))
+        self.assertEqual(-1, self.path_list.position("/not/there.jpg"))
+        self.assertEqual(-1, self.path_list.position(None))
+        self.assertNotIn(None, self.path_list)
+        with self.assertRaises(ValueError):
+            self.path_list.index("/not/there.jpg")
+
+    def test_duplicates(self):
+        self.path_list.extend("/Volumes/Backup/photos/2018/00", ["IMG_0001.jpg", "new.jpg"])
+        self.assertEqual(1, self.path_list.position("/Volumes/Backup/photos/2018/00/IMG_0001.jpg"))
+        self.assertEqual(1001, self.path_list.position("/Volumes/Backup/photos/2018/00/new.jpg"))
+        self.assertEqual([range(0, 100), range(1000, 1002)],
+                         self.path_list.dir_ranges("/Volumes/Backup/photos/2018/00"))
+        self.assertEqual(10, self.path_list.dir_count())
+
+    def test_add_remove(self):
+        position = self.path_list.add("/Volumes/Backup/photos/2018/03", "new.jpg")
+        self.assertEqual(400, position)
+        self.paths.insert(400, "/Volumes/Backup/photos/2018/03/new.jpg")
+        self.assertEqual(self.paths, list(self.path_list))
+        self.assertEqual([range(300, 401)], self.path_list.dir_ranges("/Volumes/Backup/photos/2018/03"))
+        self.assertEqual([range(401, 501)], self.path_list.dir_ranges("/Volumes/Backup/photos/2018/04"))
+        self.assertEqual(401, self.path_list.position("/Volumes/Backup/photos/2018/04/IMG_0000.jpg"))
+
+        self.path_list.remove(5)
+        del self.paths[5]
+        self.assertEqual(self.paths, list(self.path_list))
+        self.assertEqual(399, self.path_list.position("/Volumes/Backup/photos/2018/03/new.jpg"))
+
+        self.path_list.remove_range(99, 199)
+        del self.paths[99:199]
+        self.assertEqual(self.paths, list(self.path_list))
+        self.assertEqual(9, self.path_list.dir_count())
+        self.assertNotIn("/Volumes/Backup/photos/2018/01", self.path_list.dirs())
+
+        self.assertEqual(len(self.path_list), self.path_list.add("/Volumes/other", "a.jpg"))
+        self.assertEqual(10, self.path_list.dir_count())
+
+    def test_trailing_separator(self):
+        path_list = PathList()
+        path_list.extend("/photos/", ["a.jpg"])
+        self.assertEqual("/photos/a.jpg", path_list[0])
+        self.assertEqual(0, path_list.position("/photos/a.jpg"))
+
+    def test_pickle(self):
+        self.path_list.position(self.paths[10])
+        reloaded = pickle.loads(pickle.dumps(self.path_list))
+        self.assertEqual(self.paths, list(reloaded))
+        self.assertEqual(555, reloaded.position(self.paths[555]))
+
+    def test_many_directories(self):
+        path_list = PathList()
+        paths = []
+        for d in range(1000):
+            dir_path = "/photos/%04d" % d
+            names = ["IMG_%04d.jpg" % n for n in range(5)]
+            path_list.extend(dir_path, names)
+            paths.extend(os.path.join(dir_path, name) for name in names)
+        for idx in range(0, len(paths), 7):
+            self.assertEqual(idx, path_list.position(paths[idx]))
+
+        self.assertEqual(10, path_list.add("/photos/0001", "new.jpg"))
+        paths.insert(10, "/photos/0001/new.jpg")
+        path_list.remove_range(20, 40)
+        del paths[20:40]
+        self.assertEqual(paths, list(path_list))
+        for idx, path in enumerate(paths):
+            self.assertEqual(idx, path_list.position(path))
+        self.assertEqual(-1, path_list.position("/photos/0004/IMG_0000.jpg"))
+
+    def test_churn(self):
+        self.path_list.position(self.paths[0])
+        nbytes = self.path_list.nbytes()
+        for n in range(10000):
+            name = "NEW_%05d.jpg" % n
+            position = self.path_list.add("/Volumes/Backup/photos/2018/05", name)
+            self.assertEqual(600, position)
+            self.assertEqual(position, self.path_list.position("/Volumes/Backup/photos/2018/05/" + name))
+            self.path_list.remove(position)
+        self.assertEqual(self.paths, list(self.path_list))
+        self.assertEqual(777, self.path_list.position(self.paths[777]))
+        self.assertEqual(-1, self.path_list.position("/Volumes/Backup/photos/2018/05/NEW_00001.jpg"))
+        # bytes of removed names are reclaimed
+        self.assertLessEqual(self.path_list.nbytes(), 2 * nbytes)
+
+    def test_memory(self):
+        self.path_list.position(self.paths[0])
+        index_map = {path: idx for idx, path in enumerate(self.paths)}
+        size_list = (sys.getsizeof(self.paths) + sum(sys.getsizeof(p) for p in self.paths)
+                     + sys.getsizeof(index_map))
+        size_compact = self.path_list.nbytes() + sum(sys.getsizeof(d) for d in self.path_list.dirs())
+        self.assertLess(size_compact * 4, size_list)
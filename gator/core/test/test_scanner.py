@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from core.navigator import Universe
+from core.scanner import Scanner, ScanIndex
+
+
+def set_old_mtimes(root):
+    for (dir_path, dir_names, filenames) in os.walk(root):
+        os.utime(dir_path, (1000000000, 1000000000))
+
+
+def make_tree(root, folders=5, depth=3, files=4):
+    for path in ["/".join(["d%d" % i] * d) for i in range(folders) for d in range(1, depth + 1)]:
+        dir_path = os.path.join(root, path)
+        os.makedirs(dir_path, exist_ok=True)
+        for f in range(files):
+            ext = ".jpg" if f % 2 == 0 else ".txt"
+            open(os.path.join(dir_path, "f%d%s" % (f, ext)), "w").close()
+
+
+class TestScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        make_tree(self.root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_scan_in_walk_order(self):
+        expected = [(dir_path, filenames) for (dir_path, dir_names, filenames) in os.walk(self.root)]
+        for workers in [1, 4]:
+            scanner = Scanner([self.root], workers=workers)
+            self.assertEqual(expected, list(scanner.scan()))
+
+    def test_progress(self):
+        progress = []
+        scanner = Scanner([self.root, os.path.join(self.root, "does_not_exist")],
+                          progress=lambda d, f: progress.append((d, f)))
+        list(scanner.scan())
+        self.assertEqual(17, progress[-1][0])
+        self.assertEqual(60, progress[-1][1])
+
+    def test_universe(self):
+        universe = Universe([self.root, self.root], workers=3)
+        expected = [os.path.join(dir_path, fn) for (dir_path, dir_names, filenames) in os.walk(self.root)
+                    for fn in filenames if fn.endswith(".jpg")]
+        self.assertEqual(expected * 2, universe.filename_list())
+        self.assertEqual(15, universe.folder_count())
+
+
+class TestScanIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "root")
+        self.index_file = os.path.join(self.tmp.name, "universe.idx")
+        make_tree(self.root)
+        set_old_mtimes(self.root)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_incremental_scan(self):
+        scanner = Scanner([self.root], index=ScanIndex(self.index_file))
+        list(scanner.scan())
+        self.assertEqual(16, scanner.listed_count())
+
+        scanner = Scanner([self.root], index=ScanIndex(self.index_file))
+        list(scanner.scan())
+        self.assertEqual(0, scanner.listed_count())
+
+        changed = os.path.join(self.root, "d2", "d2")
+        open(os.path.join(changed, "new.jpg"), "w").close()
+        os.makedirs(os.path.join(changed, "new_dir"))
+        open(os.path.join(changed, "new_dir", "new.jpg"), "w").close()
+        scanner = Scanner([self.root], index=ScanIndex(self.index_file))
+        scanned = list(scanner.scan())
+        self.assertEqual(2, scanner.listed_count())
+        expected = [(dir_path, filenames) for (dir_path, dir_names, filenames) in os.walk(self.root)]
+        self.assertEqual(expected, scanned)
+
+    def test_universe_with_index(self):
+        expected = Universe([self.root]).filename_list()
+        self.assertEqual(expected, Universe([self.root], index_file=self.index_file).filename_list())
+        self.assertEqual(expected, Universe([self.root], index_file=self.index_file).filename_list())
+
+    def test_key_mismatch(self):
+        list(Scanner([self.root], index=ScanIndex(self.index_file, key="a")).scan())
+        self.assertEqual(16, len(ScanIndex(self.index_file, key="a").listings))
+        self.assertEqual(0, len(ScanIndex(self.index_file, key="b").listings))
@@ -1,9 +1,11 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
+import statistics
 import unittest
+from unittest import mock
 
 from core import services
-from core.services import Stat
+from core.services import CountStat, LruCache, Stat
 
 
 class ServicesTest(unittest.TestCase):
@@ -23,4 +25,72 @@ class StatTest(unittest.TestCase):
         print(stat.to_string(" | "))
 
         stat = Stat([6, 5])
-        print(stat.to_string(" | "))
\ No newline at end of file
+        print(stat.to_string(" | "))
+
+    def test_from_histogram(self):
+        sequences = [[], [3], [6, 5], [1, 1, 2, 3, 3, 3, 7], [0, 4, 4, 1], list(range(0, 100, 2))]
+        for sequence in sequences:
+            histogram = {}
+            for value in sequence:
+                histogram[value] = histogram.get(value, 0) + 1
+            for total in [0, len(sequence) + 3]:
+                padded = sequence + [0] * (total - len(sequence)) if total else sequence
+                stat = Stat.from_histogram(histogram, total)
+                self.assertEqual(stat.to_dict(), Stat(padded).to_dict())
+                self.assertEqual(len(padded), stat.len_seq())
+                if len(padded) > 1:
+                    self.assertEqual(statistics.mean(padded), stat.mean())
+                    self.assertIs(type(statistics.mean(padded)), type(stat.mean()))
+                    self.assertEqual(statistics.median(padded), stat.median())
+                    self.assertIs(type(statistics.median(padded)), type(stat.median()))
+                    self.assertAlmostEqual(statistics.stdev(padded), stat.stdev())
+                    self.assertEqual(statistics.median_low(padded), stat.median_low())
+
+    def test_total(self):
+        sequence = [1, 1, 2, 3, 3, 3, 7]
+        self.assertEqual(Stat(sequence + [0] * 5).to_dict(), Stat(sequence, total=12).to_dict())
+        self.assertEqual(Stat([1.5, 2.5, 0, 0]).to_dict(), Stat([1.5, 2.5], total=4).to_dict())
+        self.assertEqual(Stat([0, 0]).to_dict(), Stat([], total=2).to_dict())
+
+    def test_large_sequence(self):
+        sequence = [i % 7 for i in range(100000)]
+        # computed from the histogram, without going through the padded sequence
+        with mock.patch.multiple(services, mean=mock.DEFAULT, median=mock.DEFAULT, stdev=mock.DEFAULT) as mocks:
+            stat = Stat(sequence, total=1000000)
+        for function in mocks.values():
+            function.assert_not_called()
+        self.assertEqual(1000000, stat.len_seq())
+        self.assertEqual(900000 + 100000 // 7 + 1, stat.len_min())
+        self.assertEqual(0, stat.median())
+        self.assertAlmostEqual(0.299995, stat.mean())
+
+
+class CountStatTest(unittest.TestCase):
+
+    def test_increment(self):
+        count_stat = CountStat({"a": 2, "b": 1})
+        self.assertEqual(2, count_stat.increment("b"))
+        self.assertEqual(1, count_stat.increment("c"))
+        self.assertEqual({2: 2, 1: 1}, count_stat.histogram())
+        self.assertEqual(3, len(count_stat))
+        self.assertEqual(Stat([2, 2, 1, 0]).to_dict(), count_stat.stat(total=4).to_dict())
+
+
+class LruCacheTest(unittest.TestCase):
+
+    def test_size_bound(self):
+        cache = LruCache(10)
+        self.assertTrue(cache.put("a", "aaaa"))
+        self.assertTrue(cache.put("b", "bbbb"))
+        self.assertEqual("aaaa", cache.get("a"))
+        self.assertTrue(cache.put("c", "cccc"))
+        self.assertNotIn("b", cache)
+        self.assertEqual(["aaaa", "cccc"], [cache.get("a"), cache.get("c")])
+        self.assertEqual(8, cache.size())
+
+        self.assertFalse(cache.put("d", "d" * 11))
+        self.assertTrue(cache.put("a", "aa"))
+        self.assertEqual(6, cache.size())
+        cache.discard("c")
+        self.assertEqual((1, 2), (len(cache), cache.size()))
+        self.assertIsNone(cache.get("c"))
@@ -0,0 +1,146 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+
+from core import watcher
+from core.navigator import Universe
+from core.watcher import PollingWatcher, InotifyWatcher
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        for folder in ["a", "b"]:
+            os.makedirs(os.path.join(self.root, folder))
+            for fn in ["1.jpg", "2.jpg", "3.txt"]:
+                open(os.path.join(self.root, folder, fn), "w").close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.root, *names)
+
+    def test_apply(self):
+        universe = Universe([self.root])
+        self.assertTrue(universe.apply([(watcher.CREATED, self.path("a", "4.jpg"))]))
+        self.assertFalse(universe.apply([(watcher.CREATED, self.path("a", "4.txt"))]))
+        self.assertEqual(5, universe.size())
+        self.assertEqual(self.path("a", "4.jpg"),
+                         universe.filename_by_index(universe.folder_ranges(self.path("a"))[0][-1]))
+        self.assertTrue(universe.apply([(watcher.DELETED, self.path("a", "1.jpg"))]))
+        self.assertTrue(universe.apply([(watcher.FOLDER_DELETED, self.path("b"))]))
+        self.assertEqual(2, universe.size())
+        self.assertEqual(1, universe.folder_count())
+        self.assertEqual(3, universe.modification_count())
+
+    def test_polling(self):
+        poller = PollingWatcher([self.root], None, accept=Universe.is_image)
+        self.assertEqual(4, len(poller.poll()))
+        self.assertEqual([], poller.poll())
+
+        open(self.path("a", "4.jpg"), "w").close()
+        os.remove(self.path("a", "1.jpg"))
+        shutil.rmtree(self.path("b"))
+        events = poller.poll()
+        self.assertEqual(sorted([(watcher.CREATED, self.path("a", "4.jpg")),
+                                 (watcher.DELETED, self.path("a", "1.jpg")),
+                                 (watcher.FOLDER_DELETED, self.path("b"))]), sorted(events))
+
+    def changed_after_scan(self) -> list:
+        open(self.path("a", "4.jpg"), "w").close()
+        os.remove(self.path("a", "1.jpg"))
+        shutil.rmtree(self.path("b"))
+        return sorted([(watcher.CREATED, self.path("a", "4.jpg")),
+                       (watcher.DELETED, self.path("a", "1.jpg")),
+                       (watcher.FOLDER_DELETED, self.path("b"))])
+
+    def test_polling_known(self):
+        universe = Universe([self.root])
+        events = queue.Queue()
+        poller = PollingWatcher([self.root], events.put, accept=Universe.is_image, known=universe.filenames())
+        poller.start()
+        try:
+            self.assertTrue(poller.wait_ready(5))
+            self.assertTrue(events.empty())
+        finally:
+            poller.stop()
+
+        expected = self.changed_after_scan()
+        poller = PollingWatcher([self.root], events.put, accept=Universe.is_image, known=universe.filenames())
+        poller.start()
+        try:
+            self.assertTrue(poller.wait_ready(5))
+            self.assertEqual(expected, sorted(events.get(timeout=5)))
+        finally:
+            poller.stop()
+
+    @unittest.skipUnless(InotifyWatcher.available(), "inotify not available")
+    def test_inotify_known(self):
+        universe = Universe([self.root])
+        events = queue.Queue()
+        inotify = InotifyWatcher([self.root], events.put, accept=Universe.is_image, known=universe.filenames())
+        inotify.start()
+        try:
+            # an unchanged tree gives no events
+            self.assertTrue(inotify.wait_ready(5))
+            self.assertTrue(events.empty())
+        finally:
+            inotify.stop()
+
+        expected = self.changed_after_scan()
+        inotify = InotifyWatcher([self.root], events.put, accept=Universe.is_image, known=universe.filenames())
+        inotify.start()
+        try:
+            self.assertTrue(inotify.wait_ready(5))
+            self.assertEqual(expected, sorted(events.get(timeout=5)))
+            self.assertTrue(universe.apply(expected))
+            self.assertEqual([self.path("a", "2.jpg"), self.path("a", "4.jpg")], universe.filename_list())
+        finally:
+            inotify.stop()
+
+    @unittest.skipUnless(InotifyWatcher.available(), "inotify not available")
+    def test_inotify(self):
+        events = queue.Queue()
+        inotify = InotifyWatcher([self.root], events.put, accept=Universe.is_image)
+        inotify.start()
+        try:
+            self.assertTrue(inotify.wait_ready(5))
+            open(self.path("a", "4.jpg"), "w").close()
+            self.assertEqual([(watcher.CREATED, self.path("a", "4.jpg"))], events.get(timeout=5))
+            os.rename(self.path("b"), self.path("a", "b"))
+            received = []
+            while len(received) < 3:
+                received.extend(events.get(timeout=5))
+            self.assertEqual(sorted([(watcher.FOLDER_DELETED, self.path("b")),
+                                     (watcher.CREATED, self.path("a", "b", "1.jpg")),
+                                     (watcher.CREATED, self.path("a", "b", "2.jpg"))]), sorted(received))
+        finally:
+            inotify.stop()
+
+    @unittest.skipUnless(InotifyWatcher.available(), "inotify not available")
+    def test_inotify_move_out(self):
+        os.makedirs(self.path("b", "c"))
+        outside = tempfile.TemporaryDirectory()
+        events = queue.Queue()
+        inotify = InotifyWatcher([self.root], events.put, accept=Universe.is_image)
+        inotify.start()
+        try:
+            self.assertTrue(inotify.wait_ready(5))
+            self.assertEqual(4, len(inotify._InotifyWatcher__watches))
+            os.rename(self.path("b"), os.path.join(outside.name, "b"))
+            self.assertEqual([(watcher.FOLDER_DELETED, self.path("b"))], events.get(timeout=5))
+            self.assertEqual(2, len(inotify._InotifyWatcher__watches))
+
+            open(os.path.join(outside.name, "b", "c", "4.jpg"), "w").close()
+            open(self.path("a", "4.jpg"), "w").close()
+            self.assertEqual([(watcher.CREATED, self.path("a", "4.jpg"))], events.get(timeout=5))
+        finally:
+            inotify.stop()
+            outside.cleanup()
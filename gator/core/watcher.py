@@ -0,0 +1,329 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watching directory trees for files that are created, deleted or moved.
+
+A :class:`Watcher` reports changes as lists of events to a callback. Each event is a tuple (kind, path),
+where kind is one of :data:`CREATED`, :data:`DELETED`, :data:`FOLDER_DELETED` or :data:`RESCAN`.
+The callback is called on the thread of the watcher.
+
+A watcher can be given the files its callback already knows, e.g. the filenames of a universe. When it starts,
+it reports the differences between these and the trees as found, computed on the thread of the watcher.
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import platform
+import select
+import struct
+import threading
+import time
+
+from core.paths import PathList
+from core.scanner import Scanner, ScanIndex, list_dir, MTIME_MARGIN_NS
+
+LOG = logging.getLogger(__name__)
+
+#: A file was created or moved into a watched directory.
+CREATED = "created"
+#: A file was deleted or moved out of a watched directory.
+DELETED = "deleted"
+#: A directory was deleted or moved out of a watched directory.
+FOLDER_DELETED = "folder_deleted"
+#: Events were lost; the watched trees should be scanned again.
+RESCAN = "rescan"
+
+
+class Watcher(object):
+    """
+    Base class for watchers of directory trees.
+    """
+
+    def __init__(self, path_list, callback, accept=None, known: PathList=None):
+        """
+        Initialize a :class:`Watcher`.
+
+        :param list path_list: the roots of the trees to watch
+        :param callback: callable that receives a list of events
+        :param accept: optional callable that decides on file names to report
+        :param PathList known: optional files known to the callback; only differences are reported at start
+        """
+        self._path_list = list(path_list)
+        self._callback = callback
+        self._accept = accept
+        self._known = known
+        self._stopped = threading.Event()
+        self._ready = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self._run, name=self.__class__.__name__, daemon=True)
+        self.__thread.start()
+        LOG.info("Started %s on %d paths" % (self.__class__.__name__, len(self._path_list)))
+
+    def stop(self):
+        self._stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+            LOG.info("Stopped %s" % self.__class__.__name__)
+
+    def wait_ready(self, timeout=None) -> bool:
+        """
+        Wait until the trees are watched and the differences with the known files are reported.
+
+        :param float timeout: seconds to wait at most, `None` to wait without limit
+        :return: `True` if this watcher is ready
+        """
+        return self._ready.wait(timeout)
+
+    def _run(self):
+        raise NotImplementedError
+
+    def _report(self, events: list):
+        if events and not self._stopped.is_set():
+            try:
+                self._callback(events)
+            except Exception as err:
+                LOG.exception("Error while reporting events: %s" % err)
+
+    def _accepts(self, name) -> bool:
+        return self._accept is None or self._accept(name)
+
+    def _initial_events(self, listings: dict) -> list:
+        """
+        The differences between the known files and the given listings of the watched trees.
+
+        :param dict listings: dict of directory path to :class:`core.scanner.Listing`
+        :return: list of events, empty if no files are known
+        """
+        if self._known is None:
+            return []
+        events = []
+        for dir_path, listing in listings.items():
+            known_names = {self._known.name(i) for r in self._known.dir_ranges(dir_path) for i in r}
+            names = set(listing.files)
+            events.extend((DELETED, os.path.join(dir_path, name)) for name in known_names if name not in names)
+            events.extend((CREATED, os.path.join(dir_path, name)) for name in listing.files
+                          if name not in known_names)
+        events.extend((FOLDER_DELETED, dir_path) for dir_path in self._known.dirs() if dir_path not in listings)
+        return events
+
+
+class PollingWatcher(Watcher):
+    """
+    Watches directory trees by scanning them periodically. Only directories of which the modification time
+    changed are listed again.
+    """
+
+    def __init__(self, path_list, callback, accept=None, known: PathList=None, interval=30.0):
+        Watcher.__init__(self, path_list, callback, accept, known)
+        self.__interval = interval
+        self.__index = ScanIndex(None)
+
+    def poll(self) -> list:
+        """
+        Scan the watched trees and compute events from the difference with the previous scan.
+
+        :return: list of events
+        """
+        previous = self.__index.listings
+        scanner = Scanner(self._path_list, self._accept, index=self.__index)
+        scanner.scan()
+        listings = scanner.listings()
+        events = []
+        for path, listing in listings.items():
+            old = previous.get(path)
+            if old is listing:
+                continue
+            old_files = set() if old is None else set(old.files)
+            files = set(listing.files)
+            events.extend((DELETED, os.path.join(path, name)) for name in old_files if name not in files)
+            events.extend((CREATED, os.path.join(path, name)) for name in listing.files if name not in old_files)
+        for path in previous:
+            if path not in listings:
+                events.append((FOLDER_DELETED, path))
+        return events
+
+    def _run(self):
+        self.poll()
+        self._report(self._initial_events(self.__index.listings))
+        self._ready.set()
+        while not self._stopped.wait(self.__interval):
+            self._report(self.poll())
+
+
+class InotifyWatcher(Watcher):
+    """
+    Watches directory trees with the inotify API of the Linux kernel. Note that inotify does not report
+    changes made by other machines on network file systems; use a :class:`PollingWatcher` for those.
+    """
+
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+    EVENT_HEADER = struct.Struct("iIII")
+
+    __libc = None
+
+    @staticmethod
+    def libc():
+        if InotifyWatcher.__libc is None and platform.system() == "Linux":
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            if hasattr(libc, "inotify_init1"):
+                InotifyWatcher.__libc = libc
+        return InotifyWatcher.__libc
+
+    @staticmethod
+    def available() -> bool:
+        return InotifyWatcher.libc() is not None
+
+    def __init__(self, path_list, callback, accept=None, known: PathList=None):
+        Watcher.__init__(self, path_list, callback, accept, known)
+        self.__fd = -1
+        self.__wake_r, self.__wake_w = -1, -1
+        self.__watches = dict()
+        self.__watching = True
+
+    def start(self):
+        self.__fd = InotifyWatcher.libc().inotify_init1(InotifyWatcher.IN_NONBLOCK | InotifyWatcher.IN_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.__wake_r, self.__wake_w = os.pipe()
+        Watcher.start(self)
+
+    def stop(self):
+        self._stopped.set()
+        if self.__wake_w >= 0:
+            os.write(self.__wake_w, b"x")
+        Watcher.stop(self)
+        for fd in (self.__fd, self.__wake_r, self.__wake_w):
+            if fd >= 0:
+                os.close(fd)
+        self.__fd, self.__wake_r, self.__wake_w = -1, -1, -1
+        self.__watches.clear()
+
+    def __add_watch(self, path) -> bool:
+        wd = InotifyWatcher.libc().inotify_add_watch(self.__fd, os.fsencode(path), InotifyWatcher.WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            LOG.warning("Unable to watch %s: %s" % (path, os.strerror(err)))
+            return err != errno.ENOSPC
+        self.__watches[wd] = path
+        return True
+
+    def __add_tree(self, path_list, listings: dict=None) -> dict:
+        """
+        Watch the given trees. A directory that changed after it was scanned is listed again once it is watched,
+        so that files created in between are not missed. Once the kernel refuses more watches, the remaining
+        directories are listed but not watched.
+
+        :return: dict of directory path to the :class:`core.scanner.Listing` of the directories in the trees
+        """
+        listings = dict() if listings is None else listings
+        trusted_before = time.time_ns() - MTIME_MARGIN_NS
+        scanner = Scanner(path_list, self._accept)
+        for dir_path, names in scanner.scan():
+            scanned = scanner.listings()[dir_path]
+            if self.__watching and not self.__add_watch(dir_path):
+                self.__watching = False
+            listing = list_dir(dir_path, self._accept, scanned, trusted_before) if self.__watching else scanned
+            if listing is None:
+                continue
+            listings[dir_path] = listing
+            new_dirs = [os.path.join(dir_path, name) for name in listing.dirs if name not in scanned.dirs]
+            if new_dirs:
+                self.__add_tree(new_dirs, listings)
+        return listings
+
+    def __created(self, path) -> list:
+        listings = self.__add_tree([path])
+        return [(CREATED, os.path.join(dir_path, name)) for dir_path, listing in listings.items()
+                for name in listing.files]
+
+    def __remove_tree(self, path):
+        """
+        Stop watching the given directory and the directories below it.
+        """
+        prefix = os.path.join(path, "")
+        for wd, dir_path in list(self.__watches.items()):
+            if dir_path == path or dir_path.startswith(prefix):
+                # the kernel already removed the watch if the directory was deleted
+                InotifyWatcher.libc().inotify_rm_watch(self.__fd, wd)
+                del self.__watches[wd]
+
+    def _run(self):
+        # changes after the known files were scanned and before the trees were watched are reported
+        listings = self.__add_tree(self._path_list)
+        LOG.debug("Watching %d directories" % len(self.__watches))
+        self._report(self._initial_events(listings))
+        self._ready.set()
+        while not self._stopped.is_set():
+            readable, _, _ = select.select([self.__fd, self.__wake_r], [], [])
+            if self.__fd in readable:
+                self._report(self.__read_events())
+
+    def __read_events(self) -> list:
+        events = []
+        try:
+            buffer = os.read(self.__fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = InotifyWatcher.EVENT_HEADER.unpack_from(buffer, offset)
+            offset += InotifyWatcher.EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & InotifyWatcher.IN_Q_OVERFLOW:
+                events.append((RESCAN, None))
+                continue
+            if mask & InotifyWatcher.IN_IGNORED:
+                self.__watches.pop(wd, None)
+                continue
+            dir_path = self.__watches.get(wd)
+            if dir_path is None:
+                continue
+            path = os.path.join(dir_path, name)
+            if mask & InotifyWatcher.IN_ISDIR:
+                if mask & (InotifyWatcher.IN_CREATE | InotifyWatcher.IN_MOVED_TO):
+                    events.extend(self.__created(path))
+                else:
+                    self.__remove_tree(path)
+                    events.append((FOLDER_DELETED, path))
+            elif self._accepts(name):
+                if mask & (InotifyWatcher.IN_CREATE | InotifyWatcher.IN_MOVED_TO):
+                    events.append((CREATED, path))
+                else:
+                    events.append((DELETED, path))
+        return events
+
+
+def create_watcher(path_list, callback, accept=None, known: PathList=None, polling=False,
+                   interval=30.0) -> Watcher:
+    """
+    Create a watcher for the given trees: an :class:`InotifyWatcher` if inotify is available and polling
+    is not requested, a :class:`PollingWatcher` otherwise.
+
+    :param list path_list: the roots of the trees to watch
+    :param callback: callable that receives a list of events
+    :param accept: optional callable that decides on file names to report
+    :param PathList known: optional files known to the callback; only differences are reported at start
+    :param bool polling: use a :class:`PollingWatcher`, even if inotify is available
+    :param float interval: seconds between scans of a :class:`PollingWatcher`
+    :return: a watcher, not started
+    """
+    if not polling and InotifyWatcher.available():
+        return InotifyWatcher(path_list, callback, accept, known)
+    return PollingWatcher(path_list, callback, accept, known, interval)
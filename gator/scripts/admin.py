@@ -21,10 +21,9 @@ def insert_dates():
             if len(row) > 1:
                 ins_date = datetime.strptime(row[0], read_format)
                 ins_date_str = ins_date.strftime(store.DATE_FORMAT)
-                old_date_str = date_store.bdb.get(row[1])
-                date_str = ins_date_str if old_date_str is None else "%s%s%s" % (ins_date_str, env.LIST_SEP, old_date_str)
-                # date_store.bdb.put(row[1], date_str)
-                print(date_str, row[1])
+                date_list = [ins_date] + env.unpack_dates(date_store.bdb.get_bytes(row[1]))
+                # date_store.bdb.put_bytes(row[1], env.pack_dates(date_list))
+                print(ins_date_str, len(date_list), row[1])
 
 
 def restore_date_stores():
@@ -39,13 +38,15 @@ def restore_date_stores():
     with open(view_back_up, "r", encoding="UTF-8") as f:
         reader = csv.reader(f, dialect=NlDialect)
         for row in reader:
-            date_store.bdb.put(row[0], row[1])
+            date_store.bdb.put_bytes(row[0], env.pack_dates(env.unpack_dates(row[1].encode("utf-8"))))
+    date_store.rebuild_latest()
 
     date_store = _store.acme_date_store()
     with open(acme_back_up, "r", encoding="UTF-8") as f:
         reader = csv.reader(f, dialect=NlDialect)
         for row in reader:
-            date_store.bdb.put(row[0], row[1])
+            date_store.bdb.put_bytes(row[0], env.pack_dates(env.unpack_dates(row[1].encode("utf-8"))))
+    date_store.rebuild_latest()
 
 
 
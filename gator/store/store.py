@@ -4,30 +4,166 @@ import logging
 import os
 import re
 import shutil
+import weakref
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from abc import abstractmethod
 from datetime import datetime
 
+from core.services import CountStat, Stat
 from store.obj import Resource
 
 LOG = logging.getLogger(__name__)
 
 DATE_FORMAT = "%Y%m%d%H%M%S"
 
+#: Number of added dates that are buffered before they are merged into the DataFrame of a DateStore.
+APPEND_BUFFER_SIZE = 4096
+
+#: Number of segment files of a DateStore at which the store is compacted into a single file on save.
+COMPACT_SEGMENTS = 16
+
+
+def read_dataframe(path) -> pd.DataFrame:
+    """
+    Read a DataFrame of [pad, datum] from a .csv file or from a binary .npz file. Blank pads are read as
+    empty strings.
+    :param path: the file to read
+    :return: dataframe
+    """
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, index_col=0, dtype={'pad': str, 'datum': str}, parse_dates=['datum'])
+        df['pad'] = df.pad.fillna('')
+        return df
+    with np.load(path) as data:
+        blob = data['pads'].tobytes().decode('utf-8', 'surrogateescape')
+        # with rows there is at least one pad, which may be the empty string
+        pads = np.array(blob.split('\0') if len(data['codes']) > 0 else [], dtype=object)
+        return pd.DataFrame({'pad': pads[data['codes']], 'datum': data['datum'].view('datetime64[ns]')})
+
+
+def read_segment_number(path) -> int:
+    """
+    Read the number of the last segment that is included in a binary .npz file.
+    :param path: the file to read
+    :return: segment number, 0 if the file does not include segments
+    """
+    with np.load(path) as data:
+        return int(data['segment']) if 'segment' in data.files else 0
+
+
+def write_dataframe(df: pd.DataFrame, path, segment=0):
+    """
+    Write a DataFrame of [pad, datum] to a .csv file or to a binary .npz file. In the .npz file the distinct
+    pads are stored once, joined by NUL characters; rows are stored as int32 pad codes and int64 timestamps.
+    :param df: the dataframe to write
+    :param path: the file to write
+    :param segment: number of the last segment included in a binary file
+    """
+    if path.endswith(".csv"):
+        df.to_csv(path)
+        return
+    codes, pads = pd.factorize(df.pad.fillna(''))
+    blob = '\0'.join(pads.tolist()).encode('utf-8', 'surrogateescape')
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as file:
+        np.savez(file, pads=np.frombuffer(blob, dtype=np.uint8), codes=codes.astype(np.int32),
+                 datum=df.datum.to_numpy(dtype='datetime64[ns]').view(np.int64), segment=np.int64(segment))
+    os.replace(tmp, path)
+
 
 class DateStore(object):
     """
     A Store for a string and a bunch of dates. This implementation backed by a pandas.DataFrame.
+    Added dates are buffered and merged into the DataFrame when it is accessed, or when the buffer is full.
+    The store is persisted in a binary .npz file; if that file does not exist, the store is imported from
+    a .csv file with the same base name, if any.
+
+    Dates added after the store was loaded are saved in a new segment file next to the store file, named
+    [name].[number].npz. Segments are never changed after they are written. The store file and its segments
+    are compacted into a new store file when the number of segments reaches COMPACT_SEGMENTS.
     """
 
     def __init__(self, filename, add_once=True):
         self.filename = filename
-        if os.path.exists(filename):
-            self.df = pd.read_csv(filename, index_col=0, dtype={'pad': str, 'datum': str}, parse_dates=['datum'])
+        self.__segments = list()
+        self.__segment = 0
+        csv_filename = os.path.splitext(filename)[0] + ".csv"
+        if filename.endswith(".csv"):
+            self.__df = read_dataframe(filename) if os.path.exists(filename) else DateStore.empty_dataframe()
+        elif os.path.exists(filename) or self.__find_segments(0):
+            self.__df = self.__load()
+        elif os.path.exists(csv_filename):
+            self.__df = read_dataframe(csv_filename)
+            LOG.info("Imported date store %s" % csv_filename)
         else:
-            self.df = pd.DataFrame(columns=['pad', 'datum'])
+            self.__df = DateStore.empty_dataframe()
+        self.__appended = list()
         self.__add_once = add_once
         self.__dated_set = set()
+        self.__listeners = list()
+        self.__count_stat = None
+        self.__date_index = None
+        self.__history = dict()
+        self.__saved_rows = len(self.__df)
+
+    @staticmethod
+    def empty_dataframe() -> pd.DataFrame:
+        return pd.DataFrame({'pad': pd.Series(dtype=str), 'datum': pd.Series(dtype='datetime64[ns]')})
+
+    def __find_segments(self, after) -> list:
+        """
+        Find the segment files of this store with a number greater than after.
+        :return: list of (number, path), sorted on number
+        """
+        directory, name = os.path.split(self.filename)
+        pattern = re.compile("^%s\\.([0-9]{6})\\.npz$" % re.escape(os.path.splitext(name)[0]))
+        if not os.path.isdir(directory):
+            return []
+        segments = [(int(match.group(1)), os.path.join(directory, match.group(0)))
+                    for match in (pattern.match(entry) for entry in os.listdir(directory)) if match]
+        return sorted(segment for segment in segments if segment[0] > after)
+
+    def __segment_path(self, number) -> str:
+        return "%s.%06d.npz" % (os.path.splitext(self.filename)[0], number)
+
+    def __load(self) -> pd.DataFrame:
+        frames = []
+        if os.path.exists(self.filename):
+            frames.append(read_dataframe(self.filename))
+            self.__segment = read_segment_number(self.filename)
+        for number, path in self.__find_segments(self.__segment):
+            frames.append(read_dataframe(path))
+            self.__segments.append(path)
+            self.__segment = number
+        if self.__segments:
+            LOG.info("Loaded %s with %d segments" % (self.filename, len(self.__segments)))
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def files(self) -> list:
+        """
+        Gives the files in which this store is saved.
+        :return: list of paths
+        """
+        files = [self.filename] if os.path.exists(self.filename) else []
+        return files + self.__segments
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The DataFrame of [pad, datum] of this store, including buffered dates.
+        :return: dataframe
+        """
+        self.__merge_appended()
+        return self.__df
+
+    def __merge_appended(self):
+        if self.__appended:
+            appended = pd.DataFrame(self.__appended, columns=['pad', 'datum'])
+            appended['datum'] = pd.to_datetime(appended.datum)
+            self.__df = appended if len(self.__df) == 0 else pd.concat([self.__df, appended], ignore_index=True)
+            self.__appended.clear()
 
     @abstractmethod
     def get_dates(self, resource: Resource) -> list:
@@ -47,6 +183,23 @@ class DateStore(object):
     def clear_dated(self):
         self.__dated_set.clear()
 
+    def add_listener(self, listener):
+        """
+        Add a listener that will be called with (filename, count of dates) each time a date is added.
+        Only a weak reference to the listener is kept.
+        :param listener: a bound method
+        :return: None
+        """
+        self.__listeners.append(weakref.WeakMethod(listener))
+
+    def _notify_listeners(self, filename, count):
+        for ref in list(self.__listeners):
+            listener = ref()
+            if listener is None:
+                self.__listeners.remove(ref)
+            else:
+                listener(filename, count)
+
     def add_date_on(self, resource: Resource):
         """
         Add the current date on the given resource.
@@ -56,10 +209,19 @@ class DateStore(object):
         """
         if not(resource.filename() in self.__dated_set and self.__add_once):
             new_date = datetime.today()
-            self.df = self.df.append({'pad': resource.filename(), 'datum': pd.Timestamp(new_date)}, ignore_index=True)
+            self.__appended.append((resource.filename(), new_date))
+            if len(self.__appended) >= APPEND_BUFFER_SIZE:
+                self.__merge_appended()
+            if self.__date_index is not None:
+                self.__date_index.setdefault(resource.filename(), []).append(new_date)
             len_dates = self.append_date(resource, new_date)
             self.__dated_set.add(resource.filename())
+            if self.__count_stat is not None:
+                self.__count_stat.increment(resource.filename())
+            if self.__history:
+                self.__update_history(resource.filename())
             LOG.debug("Set %s #%d on %s" % (self.__class__.__name__[:-5], len_dates, resource.filename()))
+            self._notify_listeners(resource.filename(), len_dates)
 
     def update(self, resource: Resource):
         """
@@ -75,11 +237,21 @@ class DateStore(object):
         :param resource: the resource to get the list for
         :return: list of datetime, may be empty
         """
-        if len(self.df) == 0:
-            date_list = []
-        else:
-            date_list = self.df[self.df.pad == resource.filename()].datum.dt.to_pydatetime().tolist()
-        return date_list
+        return list(self.date_index().get(resource.filename(), []))
+
+    def date_index(self) -> dict:
+        """
+        Gives the dates per pad, kept up to date on each add_date_on. The index is built on first use.
+        Do not change the returned dict or its lists.
+        :return: dict of pad to list of datetime
+        """
+        if self.__date_index is None:
+            date_index = dict()
+            if len(self.df) > 0:
+                for pad, date in zip(self.df.pad.tolist(), self.df.datum.dt.to_pydatetime().tolist()):
+                    date_index.setdefault(pad, []).append(date)
+            self.__date_index = date_index
+        return self.__date_index
 
     def resource_generator(self) -> iter:
         """
@@ -108,8 +280,32 @@ class DateStore(object):
             sequence.extend([0] * (total - x))
         return sequence
 
+    def count_stat(self) -> CountStat:
+        """
+        Gives the number of dates per pad, kept up to date on each add_date_on.
+        :return: CountStat of this store
+        """
+        if self.__count_stat is None:
+            self.__count_stat = CountStat(self.count_map())
+        return self.__count_stat
+
+    def stat(self, total=0) -> Stat:
+        """
+        Gives the Stat of the number of dates per pad, extended up to total with zero's.
+        :param total: the total
+        :return: Stat
+        """
+        return self.count_stat().stat(total)
+
     def count_dates(self, filename):
-        return len(self.df[self.df.pad == filename])
+        return len(self.date_index().get(filename, ()))
+
+    def count_map(self) -> dict:
+        """
+        Gives the number of dates per pad.
+        :return: dict of pad to count
+        """
+        return {pad: len(dates) for pad, dates in self.date_index().items()}
 
     def history_dataframe(self, threshold=0) -> pd.DataFrame:
         """
@@ -129,14 +325,61 @@ class DateStore(object):
         :param threshold: threshold for keer
         :return: list of pad
         """
-        return self.history_dataframe(threshold).pad.tolist()
+        history = self.__history.get(threshold)
+        if history is None:
+            history = OrderedDict.fromkeys(self.history_dataframe(threshold).pad.tolist())
+            self.__history[threshold] = history
+        return list(history)
+
+    def __update_history(self, filename):
+        # the date just added is the latest date of all; filename moves to the end of each history.
+        count = self.count_dates(filename)
+        for threshold, history in self.__history.items():
+            if count > threshold:
+                history[filename] = None
+                history.move_to_end(filename)
 
     def save(self, path=None):
-        if path is None:
-            path = self.filename
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        self.df.to_csv(path)
-        LOG.info('Saved date store %s' % path)
+        """
+        Save this store to its file or to the given path. A path ending in .csv is saved as csv.
+        Saving to the file of this store only writes dates added since the last save, in a new segment.
+        :param path: the file to save to, defaults to the file of this store
+        :return: None
+        """
+        if path is not None and path != self.filename:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_dataframe(self.df, path)
+            LOG.info('Saved date store %s' % path)
+            return
+
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        df = self.df
+        if self.filename.endswith(".csv"):
+            write_dataframe(df, self.filename)
+            LOG.info('Saved date store %s' % self.filename)
+        elif len(self.__segments) + 1 >= COMPACT_SEGMENTS or not os.path.exists(self.filename):
+            self.compact()
+        elif len(df) > self.__saved_rows:
+            self.__segment += 1
+            path = self.__segment_path(self.__segment)
+            write_dataframe(df.iloc[self.__saved_rows:], path)
+            self.__segments.append(path)
+            LOG.info('Saved %d dates in segment %s' % (len(df) - self.__saved_rows, path))
+        self.__saved_rows = len(df)
+
+    def compact(self):
+        """
+        Save this store in its file, replacing the file and its segments.
+        :return: None
+        """
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        df = self.df
+        write_dataframe(df, self.filename, self.__segment)
+        for path in self.__segments:
+            os.remove(path)
+        LOG.info('Saved date store %s, removed %d segments' % (self.filename, len(self.__segments)))
+        self.__segments.clear()
+        self.__saved_rows = len(df)
 
 
 class AcmeDateStore(DateStore):
@@ -178,14 +421,14 @@ class Store(object):
                             AcmeDateStore.__name__.lower()]
 
     def view_date_store(self) -> ViewDateStore:
-        filename = "store/%s.csv" % ViewDateStore.__name__.lower()
+        filename = "store/%s.npz" % ViewDateStore.__name__.lower()
         if filename not in self.stores:
             vds = ViewDateStore(os.path.join(self.store_home, filename))
             self.stores[filename] = vds
         return self.stores[filename]
 
     def acme_date_store(self) -> AcmeDateStore:
-        filename = "store/%s.csv" % AcmeDateStore.__name__.lower()
+        filename = "store/%s.npz" % AcmeDateStore.__name__.lower()
         if filename not in self.stores:
             ads = AcmeDateStore(os.path.join(self.store_home, filename))
             self.stores[filename] = ads
@@ -205,11 +448,29 @@ class Store(object):
         else:
             LOG.warning("Trying to close a store that has already been closed.")
 
-    def replicate(self):
+    def replicate(self, csv=False) -> str:
+        """
+        Replicate the date stores. The files of the stores are not changed after they are written, so they are
+        hard linked into the replication directory; they are copied if linking is not possible.
+        :param csv: also export each store in full as csv
+        :return: the replication directory
+        """
         rep_dir = self._replication_dir()
-        self.view_date_store().save(os.path.join(rep_dir, "viewdatestore.csv"))
-        self.acme_date_store().save(os.path.join(rep_dir, "acmedatestore.csv"))
+        for date_store in [self.view_date_store(), self.acme_date_store()]:
+            if csv:
+                name = os.path.splitext(os.path.basename(date_store.filename))[0]
+                date_store.save(os.path.join(rep_dir, name + ".csv"))
+            for path in date_store.files():
+                target = os.path.join(rep_dir, os.path.basename(path))
+                if os.path.lexists(target):
+                    os.remove(target)
+                try:
+                    os.link(path, target)
+                except OSError:
+                    shutil.copy2(path, target)
+            LOG.info("Replicated %s to %s" % (os.path.basename(date_store.filename), rep_dir))
         self._cleanup(rep_dir)
+        return rep_dir
 
     def _replication_dir(self):
         dir = os.path.dirname(self.store_home)
@@ -0,0 +1,163 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import pandas as pd
+
+from store.obj import Resource
+from store import store
+from store.store import Store, ViewDateStore
+
+
+class TestDateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, "store", "viewdatestore.csv")
+        self.dates = {"/a.jpg": [datetime(2018, 1, 1, 10), datetime(2018, 1, 3, 12)],
+                      "/b.jpg": [datetime(2018, 1, 2, 11)]}
+        rows = [(datetime(2018, 1, 1, 10), "/a.jpg"), (datetime(2018, 1, 2, 11), "/b.jpg"),
+                (datetime(2018, 1, 3, 12), "/a.jpg")]
+        os.makedirs(os.path.dirname(self.filename))
+        pd.DataFrame({"pad": [r[1] for r in rows], "datum": [r[0] for r in rows]}).to_csv(self.filename)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_dates_for(self):
+        vds = ViewDateStore(self.filename)
+        self.assertEqual(self.dates["/a.jpg"], vds.get_dates_for(Resource("/a.jpg")))
+        self.assertEqual(self.dates["/b.jpg"], vds.get_dates_for(Resource("/b.jpg")))
+        self.assertEqual([], vds.get_dates_for(Resource("/c.jpg")))
+        self.assertEqual(2, vds.count_dates("/a.jpg"))
+        self.assertEqual(0, vds.count_dates("/c.jpg"))
+        self.assertEqual({"/a.jpg": 2, "/b.jpg": 1}, vds.count_map())
+
+    def test_empty(self):
+        vds = ViewDateStore(os.path.join(self.tmp.name, "none.csv"))
+        self.assertEqual([], vds.get_dates_for(Resource("/a.jpg")))
+        self.assertEqual({}, vds.count_map())
+
+    def test_add_date_on(self):
+        vds = ViewDateStore(self.filename, add_once=False)
+        resource = Resource("/c.jpg")
+        for i in range(3):
+            vds.add_date_on(resource)
+        vds.add_date_on(Resource("/a.jpg"))
+        self.assertEqual(3, vds.count_dates("/c.jpg"))
+        self.assertEqual(3, len(vds.get_dates_for(resource)))
+        self.assertEqual(7, len(vds.df))
+        self.assertEqual(["/b.jpg", "/c.jpg", "/a.jpg"], vds.history_keys())
+        vds.save()
+
+        reloaded = ViewDateStore(self.filename)
+        self.assertEqual(vds.get_dates_for(resource), reloaded.get_dates_for(resource))
+        self.assertEqual({"/a.jpg": 3, "/b.jpg": 1, "/c.jpg": 3}, reloaded.count_map())
+
+    def test_add_date_on_empty(self):
+        vds = ViewDateStore(os.path.join(self.tmp.name, "store", "new.csv"))
+        vds.add_date_on(Resource("/a.jpg"))
+        vds.add_date_on(Resource("/a.jpg"))
+        self.assertEqual(1, vds.count_dates("/a.jpg"))
+        self.assertEqual(["/a.jpg"], vds.history_keys())
+
+    def test_binary(self):
+        vds = ViewDateStore(os.path.join(self.tmp.name, "store", "viewdatestore.npz"))
+        self.assertEqual(self.dates["/a.jpg"], vds.get_dates_for(Resource("/a.jpg")))
+        vds.add_date_on(Resource("/d\u00e9.jpg"))
+        vds.save()
+        self.assertTrue(os.path.exists(vds.filename))
+
+        reloaded = ViewDateStore(vds.filename)
+        self.assertEqual(vds.count_map(), reloaded.count_map())
+        self.assertEqual(vds.get_dates_for(Resource("/d\u00e9.jpg")),
+                         reloaded.get_dates_for(Resource("/d\u00e9.jpg")))
+        self.assertEqual(vds.history_keys(), reloaded.history_keys())
+
+        csv_filename = os.path.join(self.tmp.name, "export.csv")
+        reloaded.save(csv_filename)
+        self.assertEqual(vds.count_map(), ViewDateStore(csv_filename).count_map())
+
+    def test_binary_blank_pads(self):
+        with open(self.filename, "a") as file:
+            file.write("3,,2018-01-04 10:00:00\n4,,2018-01-05 10:00:00\n")
+        vds = ViewDateStore(self.filename)
+        self.assertEqual({"/a.jpg": 2, "/b.jpg": 1, "": 2}, vds.count_map())
+
+        filename = os.path.join(self.tmp.name, "store", "blank.npz")
+        store.write_dataframe(vds.df, filename)
+        reloaded = store.read_dataframe(filename)
+        self.assertEqual(vds.df.pad.tolist(), reloaded.pad.tolist())
+        self.assertEqual(vds.df.datum.tolist(), reloaded.datum.tolist())
+        only_blank = pd.DataFrame({"pad": ["", None], "datum": [datetime(2018, 1, 1), datetime(2018, 1, 2)]})
+        store.write_dataframe(only_blank, filename)
+        self.assertEqual(["", ""], store.read_dataframe(filename).pad.tolist())
+
+    def test_binary_empty(self):
+        vds = ViewDateStore(os.path.join(self.tmp.name, "store", "empty.npz"))
+        vds.save()
+        self.assertEqual({}, ViewDateStore(vds.filename).count_map())
+
+    def test_segments(self):
+        filename = os.path.join(self.tmp.name, "store", "viewdatestore.npz")
+        vds = ViewDateStore(filename, add_once=False)
+        vds.save()
+        self.assertEqual([filename], vds.files())
+        vds.save()
+        self.assertEqual([filename], vds.files())
+
+        for session in range(3):
+            vds = ViewDateStore(filename, add_once=False)
+            vds.add_date_on(Resource("/a.jpg"))
+            vds.add_date_on(Resource("/e.jpg"))
+            vds.save()
+            self.assertEqual(session + 2, len(vds.files()))
+        reloaded = ViewDateStore(filename)
+        self.assertEqual({"/a.jpg": 5, "/b.jpg": 1, "/e.jpg": 3}, reloaded.count_map())
+
+        reloaded.compact()
+        self.assertEqual([filename], reloaded.files())
+        self.assertEqual([filename], ViewDateStore(filename).files())
+        self.assertEqual(reloaded.count_map(), ViewDateStore(filename).count_map())
+
+    def test_compact_on_save(self):
+        filename = os.path.join(self.tmp.name, "store", "viewdatestore.npz")
+        for session in range(store.COMPACT_SEGMENTS + 1):
+            vds = ViewDateStore(filename)
+            vds.add_date_on(Resource("/a.jpg"))
+            vds.save()
+            self.assertLessEqual(len(vds.files()), store.COMPACT_SEGMENTS)
+        self.assertEqual(store.COMPACT_SEGMENTS + 3, ViewDateStore(filename).count_dates("/a.jpg"))
+
+    def test_replicate(self):
+        gator_store = Store(os.path.join(self.tmp.name, "db"))
+        gator_store.view_date_store().add_date_on(Resource("/a.jpg"))
+        gator_store.close()
+        gator_store = Store(os.path.join(self.tmp.name, "db"))
+        gator_store.view_date_store().add_date_on(Resource("/a.jpg"))
+        gator_store.view_date_store().save()
+        rep_dir = gator_store.replicate()
+        self.assertEqual(["acmedatestore.npz", "viewdatestore.000001.npz", "viewdatestore.npz"],
+                         sorted(os.listdir(rep_dir)))
+        replica = ViewDateStore(os.path.join(rep_dir, "viewdatestore.npz"))
+        self.assertEqual(2, replica.count_dates("/a.jpg"))
+
+        rep_dir = gator_store.replicate(csv=True)
+        self.assertIn("viewdatestore.csv", os.listdir(rep_dir))
+        replica = ViewDateStore(os.path.join(rep_dir, "viewdatestore.csv"))
+        self.assertEqual(2, replica.count_dates("/a.jpg"))
+
+    def test_history_keys(self):
+        vds = ViewDateStore(self.filename, add_once=False)
+        self.assertEqual(["/b.jpg", "/a.jpg"], vds.history_keys())
+        self.assertEqual(["/a.jpg"], vds.history_keys(1))
+        vds.history_keys().clear()
+        for filename in ["/b.jpg", "/c.jpg", "/a.jpg", "/c.jpg"]:
+            vds.add_date_on(Resource(filename))
+        for threshold in [0, 1, 2]:
+            expected = vds.history_dataframe(threshold).pad.tolist()
+            self.assertEqual(expected, vds.history_keys(threshold))
+        self.assertEqual(["/b.jpg", "/a.jpg", "/c.jpg"], vds.history_keys(1))